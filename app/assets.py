@@ -0,0 +1,176 @@
+"""Fingerprinted, precompressed static assets.
+
+``python -m app.assets build`` copies every file of STATIC_DIR into
+STATIC_BUILD_DIR under a content-hashed name (script.js ->
+script.3f2a9c1b7e4d.js), rewrites the /static/ references in index.html
+to those names, stores .gz and .br variants next to each file and writes
+manifest.json (source name -> fingerprinted name).
+
+PrecompressedStaticFiles then serves the best variant the client accepts.
+Fingerprinted files never change under a given name, so they are cached
+for a year as immutable; index.html is always revalidated, so a new build
+is picked up on the next page load. Without a build the sources are
+served uncompressed and revalidated.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Set
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import stat
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from app.compression import accepted_encodings, accepts
+
+try:
+    import brotli
+except ImportError:  # optional dependency: only gzip variants are built
+    brotli = None
+
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(STATIC_DIR, "dist"))
+MANIFEST_NAME = "manifest.json"
+INDEX_NAME = "index.html"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first; file suffix of each precompressed variant
+ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+# Variants are only kept when they save at least this fraction of the size
+MIN_COMPRESSION_SAVING = 0.1
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, dot, suffix = name.rpartition(".")
+    return f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+
+
+def write_variants(path: Path, content: bytes) -> None:
+    """Store .gz (and .br when brotli is installed) next to a built file."""
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) <= len(content) * (1 - MIN_COMPRESSION_SAVING):
+            Path(f"{path}{suffix}").write_bytes(compressed)
+
+
+def build(source_dir: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR) -> Dict[str, str]:
+    """Build the fingerprinted asset tree; returns the manifest."""
+    source = Path(source_dir)
+    target = Path(build_dir)
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+
+    manifest = {}
+    for path in sorted(source.rglob("*")):
+        if not path.is_file() or target in path.parents or path.name == INDEX_NAME:
+            continue
+        name = path.relative_to(source).as_posix()
+        content = path.read_bytes()
+        hashed = fingerprint(name, content)
+        output = target / hashed
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(content)
+        write_variants(output, content)
+        manifest[name] = hashed
+
+    index = source / INDEX_NAME
+    if index.exists():
+        html = index.read_text(encoding="utf-8")
+        if manifest:
+            pattern = re.compile(r"/static/(" + "|".join(re.escape(name) for name in manifest) + r")\b")
+            html = pattern.sub(lambda match: f"/static/{manifest[match.group(1)]}", html)
+        content = html.encode("utf-8")
+        (target / INDEX_NAME).write_bytes(content)
+        write_variants(target / INDEX_NAME, content)
+
+    (target / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest
+
+
+def load_manifest(build_dir: str = STATIC_BUILD_DIR) -> Optional[Dict[str, str]]:
+    path = Path(build_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves stored .br/.gz variants and sets Cache-Control.
+
+    Files listed in ``immutable`` (the fingerprinted names of a build) are
+    cached for a year; everything else must be revalidated.
+    """
+
+    def __init__(self, *, directory: str, immutable: Set[str] = frozenset(), **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.immutable = set(immutable)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = None
+        if scope["method"] in ("GET", "HEAD"):
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in ENCODING_SUFFIXES:
+                if accepts(accepted, encoding):
+                    response = await self.variant_response(path, suffix, encoding, scope)
+                    if response is not None:
+                        break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if path in self.immutable else REVALIDATE_CACHE_CONTROL
+        )
+        return response
+
+    async def variant_response(self, path: str, suffix: str, encoding: str, scope: Scope) -> Optional[Response]:
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = FileResponse(
+            full_path, stat_result=stat_result, method=scope["method"],
+            media_type=media_type, headers={"Content-Encoding": encoding},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def create_static_app() -> PrecompressedStaticFiles:
+    """Serve the build when one exists, otherwise the plain sources."""
+    manifest = load_manifest()
+    if manifest is None:
+        return PrecompressedStaticFiles(directory=STATIC_DIR)
+    return PrecompressedStaticFiles(directory=STATIC_BUILD_DIR, immutable=set(manifest.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("build", help=f"Build {STATIC_DIR}/ into {STATIC_BUILD_DIR}/")
+    parser.parse_args()
+
+    manifest = build()
+    print(f"Built {len(manifest)} assets into {STATIC_BUILD_DIR}"
+          + ("" if brotli is not None else " (brotli is not installed: gzip variants only)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
 import os
+import threading
+import time
 
+from app.cache import TTLCache
 from app.database import get_db, User
-from app.schemas import TokenData
+from app.metrics import Counter, Histogram
+from app.schemas import AuthenticatedUser, TokenData
+
+try:
+    import argon2
+except ImportError:  # optional dependency: only needed for the argon2 scheme
+    argon2 = None
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated-user cache: sha256(token) -> AuthenticatedUser.
+# Entries never outlive the token's own "exp" claim.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+
+# Dedicated worker pool for bcrypt, so hashing never blocks the event loop or
+# queues behind other threadpool work (bcrypt releases the GIL).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+# Password hashing: the first scheme hashes new passwords, the others are only
+# verified. Hashes of another scheme or cost are replaced on the next login.
+# Measure costs on the target host with python -m benchmarks.bench_password_hash
+PASSWORD_HASH_SCHEMES = [
+    scheme.strip() for scheme in os.getenv("PASSWORD_HASH_SCHEMES", "bcrypt").split(",") if scheme.strip()
+]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST_KB = int(os.getenv("ARGON2_MEMORY_COST_KB", "19456"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+
+def build_crypt_context(schemes: List[str] = PASSWORD_HASH_SCHEMES) -> CryptContext:
+    """CryptContext hashing with schemes[0] at exactly the configured cost.
+
+    min/max rounds are pinned to the configured value, so needs_update flags
+    hashes made with a lower or a higher cost as well as other schemes.
+    """
+    if "argon2" in schemes and argon2 is None:
+        raise RuntimeError("PASSWORD_HASH_SCHEMES includes argon2, but argon2-cffi is not installed")
+    settings = {}
+    if "bcrypt" in schemes:
+        settings.update(
+            bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS,
+        )
+    if "argon2" in schemes:
+        settings.update(
+            argon2__default_rounds=ARGON2_TIME_COST, argon2__min_rounds=ARGON2_TIME_COST,
+            argon2__max_rounds=ARGON2_TIME_COST, argon2__memory_cost=ARGON2_MEMORY_COST_KB,
+            argon2__parallelism=ARGON2_PARALLELISM,
+        )
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+pwd_context = build_crypt_context()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "CPU time spent in password hashing, by operation (hash or verify).",
+    ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5),
+)
+PASSWORD_REHASHES = Counter(
+    "password_rehash_total",
+    "Stored hashes upgraded to the configured scheme and cost at login, by previous scheme.",
+    ("scheme",),
+)
+
+_hash_pool_lock = threading.Lock()
+_hash_pool_stats = {
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "max_queued": 0,
+    "wait_seconds_total": 0.0,
+    "work_seconds_total": 0.0,
+}
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,7 +106,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     # Truncate password to 72 characters (well under bcrypt's 72 byte limit)
     # This avoids multi-byte UTF-8 character issues
     truncated_password = plain_password[:72]
-    return pwd_context.verify(truncated_password, hashed_password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.verify(truncated_password, hashed_password)
+    finally:
+        PASSWORD_HASH_DURATION.labels("verify").observe(time.perf_counter() - started)
 
 
 def get_password_hash(password: str) -> str:
@@ -32,7 +118,74 @@ def get_password_hash(password: str) -> str:
     # Truncate password to 72 characters (well under bcrypt's 72 byte limit)
     # This avoids multi-byte UTF-8 character issues
     truncated_password = password[:72]
-    return pwd_context.hash(truncated_password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.hash(truncated_password)
+    finally:
+        PASSWORD_HASH_DURATION.labels("hash").observe(time.perf_counter() - started)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and, if the stored hash is outdated, hash it again.
+
+    Returns (verified, new_hash); new_hash is None unless the hash needs to
+    move to the configured scheme or cost.
+    """
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if not pwd_context.needs_update(hashed_password):
+        return True, None
+    return True, get_password_hash(plain_password)
+
+
+def _run_hash_job(func: Callable, submitted_at: float, *args):
+    """Run a hashing job inside the pool, keeping queue-depth statistics."""
+    started_at = time.perf_counter()
+    with _hash_pool_lock:
+        _hash_pool_stats["queued"] -= 1
+        _hash_pool_stats["running"] += 1
+        _hash_pool_stats["wait_seconds_total"] += started_at - submitted_at
+    try:
+        return func(*args)
+    finally:
+        with _hash_pool_lock:
+            _hash_pool_stats["running"] -= 1
+            _hash_pool_stats["completed"] += 1
+            _hash_pool_stats["work_seconds_total"] += time.perf_counter() - started_at
+
+
+async def _submit_hash_job(func: Callable, *args):
+    """Queue a hashing job on the password pool and await its result."""
+    with _hash_pool_lock:
+        _hash_pool_stats["queued"] += 1
+        _hash_pool_stats["max_queued"] = max(_hash_pool_stats["max_queued"], _hash_pool_stats["queued"])
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, _run_hash_job, func, time.perf_counter(), *args
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password hashing pool."""
+    return await _submit_hash_job(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password on the password hashing pool."""
+    return await _submit_hash_job(verify_and_update_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the password hashing pool."""
+    return await _submit_hash_job(get_password_hash, password)
+
+
+def hash_pool_stats() -> dict:
+    """Return queue depth and timing counters of the password hashing pool."""
+    with _hash_pool_lock:
+        stats = dict(_hash_pool_stats)
+    stats["workers"] = PASSWORD_HASH_WORKERS
+    return stats
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -47,28 +200,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_user_by_username(db: Session, username: str) -> Optional[User]:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get a user by username."""
-    return db.query(User).filter(User.username == username).first()
+    return await db.scalar(select(User).where(User.username == username))
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get a user by email."""
-    return db.query(User).filter(User.email == email).first()
+    return await db.scalar(select(User).where(User.email == email))
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate a user."""
-    user = get_user_by_username(db, username)
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    """Authenticate a user, verifying the password on the hashing pool.
+    
+    An outdated stored hash is replaced on the returned user; the caller's
+    commit saves it.
+    """
+    user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash is not None:
+        PASSWORD_REHASHES.labels(pwd_context.identify(user.hashed_password)).inc()
+        user.hashed_password = new_hash
     return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """Get the current authenticated user."""
+def invalidate_user(user_id: int) -> int:
+    """Drop every cached identity of a user, e.g. after the user changes."""
+    return auth_cache.discard_where(lambda identity: identity.id == user_id)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> AuthenticatedUser:
+    """Get the current authenticated user.
+    
+    Identities are cached by token hash, so repeat requests with the same
+    token skip both the JWT decode and the user SELECT. Code that changes or
+    deletes a user must call invalidate_user; otherwise the old identity is
+    served for up to AUTH_CACHE_TTL_SECONDS (never past the token's `exp`).
+    """
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    cached_user = auth_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -77,13 +254,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        # Refresh tokens are only accepted by POST /token/refresh
+        if username is None or payload.get("type") == "refresh":
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_username(db, username=token_data.username)
+    user = await get_user_by_username(db, username=token_data.username)
     if user is None:
         raise credentials_exception
-    return user
+    
+    current_user = AuthenticatedUser.model_validate(user)
+    expires_in = payload["exp"] - time.time() if "exp" in payload else AUTH_CACHE_TTL_SECONDS
+    auth_cache.set(cache_key, current_user, ttl=expires_in)
+    return current_user
@@ -0,0 +1,98 @@
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List
+import csv
+import io
+import json
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.database import Calculation
+
+# Column order used for COPY
+COPY_COLUMNS = (
+    "operation", "operand1", "operand2", "expression", "variables",
+    "result", "user_id", "created_at", "updated_at", "version",
+)
+
+
+class LineTooLongError(ValueError):
+    """Raised when an uploaded line exceeds the configured maximum length."""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Split a streamed request body into lines without buffering the whole body.
+    
+    Lines are yielded undecoded, so a line that is not valid UTF-8 can be
+    reported as a row error by the caller instead of failing the request.
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+        if len(pending) > max_line_bytes:
+            raise LineTooLongError(f"Line exceeds {max_line_bytes} bytes")
+    if pending.strip():
+        yield pending.rstrip(b"\r")
+
+
+def parse_csv_line(line: str, header: List[str]) -> dict:
+    """Parse one CSV data line into a dict keyed by the header columns.
+    
+    Empty fields become None and the variables column is decoded as JSON.
+    """
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"Expected {len(header)} columns, got {len(values)}")
+    item = {column: value if value != "" else None for column, value in zip(header, values)}
+    if item.get("variables") is not None:
+        item["variables"] = json.loads(item["variables"])
+    return item
+
+
+def _copy_value(row: dict, column: str):
+    """Render a row value the way COPY expects it (JSON columns as text)."""
+    value = row[column]
+    if column == "variables" and value is not None:
+        return json.dumps(value)
+    return value
+
+
+def copy_calculations(session: Session, rows: Iterable[dict]) -> None:
+    """Load calculation rows in the session's transaction using the fastest path of the backend.
+
+    Postgres uses COPY (binary COPY through asyncpg, CSV COPY through
+    psycopg2); other backends fall back to a single executemany INSERT.
+    Rows must already contain every column in COPY_COLUMNS.
+    """
+    connection = session.connection()
+    dialect = connection.dialect
+    table_name = Calculation.__table__.name
+
+    if dialect.name != "postgresql":
+        session.execute(insert(Calculation), list(rows))
+        return
+
+    driver_connection = connection.connection.driver_connection
+    if dialect.driver == "asyncpg":
+        records = [tuple(_copy_value(row, column) for column in COPY_COLUMNS) for row in rows]
+        await_only(driver_connection.copy_records_to_table(
+            table_name, records=records, columns=list(COPY_COLUMNS)
+        ))
+    else:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(
+                row[column].isoformat() if isinstance(row[column], datetime) else _copy_value(row, column)
+                for column in COPY_COLUMNS
+            )
+        buffer.seek(0)
+        with driver_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table_name} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
@@ -0,0 +1,283 @@
+"""Live per-user change feed behind GET /calculations/stream.
+
+Every handler that writes calculations records a change event in the
+transaction that makes the change:
+
+    {"type": "created" | "updated", "calculations": [...]}
+    {"type": "deleted", "ids": [...]}
+    {"type": "reset"}    reload the list (bulk import, or events were missed)
+
+Events reach the stream subscribers of a worker through one of two backends
+(CHANGE_FEED_BACKEND, "auto" picks by database):
+  memory    events wait on the session and are handed to this worker's
+            subscribers after commit (single node, e.g. SQLite)
+  postgres  events are sent with pg_notify, which Postgres delivers only on
+            commit, to a LISTEN connection in every worker, so streams
+            served by any worker or host see every change
+
+Either way a rolled-back write publishes nothing. A subscriber more than
+CHANGE_FEED_QUEUE_SIZE events behind, and every subscriber of a worker
+whose LISTEN connection had to reconnect, gets a reset instead of the
+events it missed.
+"""
+from collections import defaultdict
+from typing import Iterable, Optional
+import asyncio
+import os
+import select
+import socket
+import threading
+
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.metrics import Counter
+from app.responses import dump_json
+from app.schemas import CalculationResponse
+
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "auto")
+# Undelivered events kept per stream before it is sent a reset instead
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+# Comment line sent on idle streams (keeps proxies from closing them); also the LISTEN health check interval
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE_SECONDS", "15"))
+
+CHANNEL = "calculation_changes"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7999
+RECONNECT_SECONDS = 1.0
+RESET = dump_json({"type": "reset"})
+_PENDING_KEY = "change_feed_pending"
+
+CHANGE_FEED_EVENTS = Counter(
+    "change_feed_events_total",
+    "Change events received by this worker's change feed (before fan-out), by type.",
+    ("type",),
+)
+
+
+class Subscription:
+    """Encoded events for one stream, queued in the stream's event loop."""
+
+    def __init__(self, feed: "ChangeFeed", user_id: int):
+        self.feed = feed
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+
+    def put(self, data: bytes) -> None:
+        if self.queue.full():
+            # Too far behind for deltas to help: drop them, the client reloads instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            data = RESET
+        self.queue.put_nowait(data)
+
+    async def get(self, timeout: float) -> Optional[bytes]:
+        """Next event, or None if there was none for ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    def __init__(self, backend: str = CHANGE_FEED_BACKEND):
+        self.backend = backend
+        self.listener: Optional["PostgresListener"] = None
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def start(self, bind: Engine) -> None:
+        """Start the LISTEN connection when the postgres backend applies to ``bind``."""
+        backend = self.backend
+        if backend == "auto":
+            backend = "postgres" if bind.dialect.name == "postgresql" else "memory"
+        if backend == "postgres":
+            self.listener = PostgresListener(bind, self._on_notify, self._on_reconnect)
+            self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def record(self, session: Session, user_id: int, change: dict) -> None:
+        """Publish ``change`` to the user's streams if and when ``session`` commits."""
+        event_type, data = change["type"], dump_json(change)
+        if self.listener is not None and session.get_bind().dialect.name == "postgresql":
+            payload = f"{user_id} {event_type} {data.decode('utf-8')}"
+            if len(payload.encode("utf-8")) > MAX_NOTIFY_BYTES:
+                payload = f"{user_id} reset {RESET.decode('utf-8')}"
+            session.execute(sql_select(func.pg_notify(CHANNEL, payload)))
+        else:
+            session.info.setdefault(_PENDING_KEY, []).append((user_id, event_type, data))
+
+    def dispatch(self, user_id: int, event_type: str, data: bytes) -> None:
+        """Hand an encoded event to the user's streams; safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        CHANGE_FEED_EVENTS.labels(event_type).inc()
+        for subscription in subscriptions:
+            _deliver(subscription, data)
+
+    def _on_notify(self, payload: str) -> None:
+        user_id, event_type, data = payload.split(" ", 2)
+        self.dispatch(int(user_id), event_type, data.encode("utf-8"))
+
+    def _on_reconnect(self) -> None:
+        # Notifications sent while the connection was down are lost: everyone reloads
+        with self._lock:
+            subscriptions = [s for user_subscriptions in self._subscriptions.values() for s in user_subscriptions]
+        for subscription in subscriptions:
+            _deliver(subscription, RESET)
+
+
+def _deliver(subscription: Subscription, data: bytes) -> None:
+    try:
+        subscription.loop.call_soon_threadsafe(subscription.put, data)
+    except RuntimeError:
+        pass  # the stream's loop is closed; its subscription is being removed
+
+
+change_feed = ChangeFeed()
+
+
+def record_calculations(session: Session, user_id: int, event_type: str, calculations: Iterable) -> None:
+    """Record a created/updated event for ORM rows or CalculationResponse objects."""
+    change_feed.record(session, user_id, {
+        "type": event_type,
+        "calculations": [CalculationResponse.model_validate(c).model_dump() for c in calculations],
+    })
+
+
+def record_deleted(session: Session, user_id: int, ids: Iterable[int]) -> None:
+    change_feed.record(session, user_id, {"type": "deleted", "ids": list(ids)})
+
+
+def record_reset(session: Session, user_id: int) -> None:
+    change_feed.record(session, user_id, {"type": "reset"})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for user_id, event_type, data in session.info.pop(_PENDING_KEY, ()):
+        change_feed.dispatch(user_id, event_type, data)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction) -> None:
+    # Runs after after_commit, so anything left belongs to a rolled-back transaction
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+async def stream_events(user_id: int, max_seconds: float):
+    """Server-Sent Events body for one user, ending after ``max_seconds``."""
+    subscription = change_feed.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        # Sent at once, so the client knows it is subscribed
+        yield b": subscribed\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            data = await subscription.get(min(CHANGE_FEED_KEEPALIVE_SECONDS, remaining))
+            yield b": keepalive\n\n" if data is None else b"data: " + data + b"\n\n"
+    finally:
+        subscription.close()
+
+
+class PostgresListener:
+    """One LISTEN connection per worker, read by a daemon thread.
+
+    Uses its own psycopg2 connection (outside the pool), reconnecting
+    after errors, and reports a reconnect so missed events become resets.
+    """
+
+    def __init__(self, bind: Engine, on_notify, on_reconnect):
+        self.bind = bind
+        self.on_notify = on_notify
+        self.on_reconnect = on_reconnect
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+        # Written to by stop() to interrupt select()
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._thread = threading.Thread(target=self._run, name="change-feed-listener", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        # Listen before any write can notify; a database that is down does not block startup
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake_write.send(b"\0")
+        self._thread.join(timeout=5)
+        self._wake_read.close()
+        self._wake_write.close()
+
+    def _connect(self):
+        connect_args, connect_kwargs = self.bind.dialect.create_connect_args(self.bind.url)
+        connection = self.bind.dialect.connect(*connect_args, **connect_kwargs)
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def _run(self) -> None:
+        connected_before = False
+        while not self._stopped.is_set():
+            try:
+                connection = self._connect()
+            except Exception as e:
+                print(f"Change feed listener could not connect: {e}")
+                self._ready.set()
+                self._stopped.wait(RECONNECT_SECONDS)
+                continue
+            if connected_before:
+                self.on_reconnect()
+            connected_before = True
+            self._ready.set()
+            try:
+                self._listen(connection)
+            except Exception as e:
+                print(f"Change feed listener lost its connection: {e}")
+                self._stopped.wait(RECONNECT_SECONDS)
+            finally:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    def _listen(self, connection) -> None:
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([connection, self._wake_read], [], [], CHANGE_FEED_KEEPALIVE_SECONDS)
+            if not readable:
+                # Idle: make sure the connection is still alive
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            connection.poll()
+            while connection.notifies:
+                self.on_notify(connection.notifies.pop(0).payload)
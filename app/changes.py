@@ -0,0 +1,127 @@
+"""Delta sync for GET /calculations/changes?since=<version>.
+
+Every calculation write bumps the user's calculations_version (which also
+locks the user row until commit) and stamps the new version on the rows
+it creates or updates. A delete instead leaves a row in
+calculation_tombstones carrying its version. A client stores the
+`version` of its last sync and later asks for rows and tombstones above
+it. Both lookups use (user_id, version) indexes, so a resync costs what
+changed since then, not the size of the history.
+
+Rows written together (a batch, an import chunk, a write-behind group)
+share one version and are never split across pages. Tombstones older
+than TOMBSTONE_TTL_DAYS are removed with:
+
+    python -m app.changes purge
+
+The purge records the highest removed version per user. A client whose
+`since` is below it has missed deletions, gets 410 Gone and must sync
+again from since=0.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable
+import argparse
+import os
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import Calculation, CalculationTombstone, SessionLocal, User, create_tables
+from app.responses import RESPONSE_COLUMNS, row_to_dict
+
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "1000"))
+TOMBSTONE_TTL_DAYS = float(os.getenv("TOMBSTONE_TTL_DAYS", "30"))
+
+
+def record_tombstones(session: Session, user_id: int, calculation_ids: Iterable[int], version: int) -> None:
+    """Mark deleted calculations; call in the delete's transaction with its version."""
+    session.execute(insert(CalculationTombstone), [
+        {"calculation_id": calculation_id, "user_id": user_id, "version": version}
+        for calculation_id in calculation_ids
+    ])
+
+
+async def load_changes(db: AsyncSession, user_id: int, since: int, limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """Rows and tombstones of versions in (since, version], where version ends the page.
+
+    since=0 returns every row (and no tombstones: the client has nothing to delete).
+    """
+    current, purged = (await db.execute(
+        select(User.calculations_version, User.calculations_purged_version).where(User.id == user_id)
+    )).one()
+    if since > current or 0 < since < purged:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"Changes since version {since} are not available; sync again from since=0",
+        )
+
+    # Writes committing meanwhile get versions above `current` and are left to the next sync
+    query = select(*RESPONSE_COLUMNS, Calculation.version).where(
+        Calculation.user_id == user_id, Calculation.version <= current
+    )
+    if since:
+        query = query.where(Calculation.version > since)
+    # row_to_dict ignores the trailing version column
+    rows = (await db.execute(query.order_by(Calculation.version, Calculation.id).limit(limit))).all()
+    version = current
+    if limit > 0 and len(rows) == limit:
+        version = rows[-1].version
+        # Finish the page's last version, so a client never holds half of one write
+        rows += (await db.execute(
+            select(*RESPONSE_COLUMNS, Calculation.version)
+            .where(Calculation.user_id == user_id, Calculation.version == version, Calculation.id > rows[-1].id)
+            .order_by(Calculation.id)
+        )).all()
+
+    deleted = []
+    if since:
+        deleted = (await db.scalars(
+            select(CalculationTombstone.calculation_id).where(
+                CalculationTombstone.user_id == user_id,
+                CalculationTombstone.version > since,
+                CalculationTombstone.version <= version,
+            ).order_by(CalculationTombstone.version)
+        )).all()
+
+    return {
+        "version": version,
+        "calculations": [row_to_dict(row) for row in rows],
+        "deleted": list(deleted),
+        "has_more": version < current,
+    }
+
+
+def purge_tombstones(session: Session) -> int:
+    """Delete tombstones older than TOMBSTONE_TTL_DAYS, remembering the newest purged version per user."""
+    cutoff = datetime.utcnow() - timedelta(days=TOMBSTONE_TTL_DAYS)
+    purged = session.execute(
+        select(CalculationTombstone.user_id, func.max(CalculationTombstone.version))
+        .where(CalculationTombstone.deleted_at < cutoff)
+        .group_by(CalculationTombstone.user_id)
+    ).all()
+    for user_id, version in purged:
+        session.execute(
+            update(User)
+            .where(User.id == user_id, User.calculations_purged_version < version)
+            .values(calculations_purged_version=version)
+        )
+    return session.execute(delete(CalculationTombstone).where(CalculationTombstone.deleted_at < cutoff)).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the calculation_tombstones table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("purge", help=f"Delete tombstones older than {TOMBSTONE_TTL_DAYS:g} days")
+    parser.parse_args()
+
+    create_tables()
+    with SessionLocal() as session:
+        rows = purge_tombstones(session)
+        session.commit()
+    print(f"Purged {rows} calculation tombstones")
+
+
+if __name__ == "__main__":
+    main()
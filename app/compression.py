@@ -0,0 +1,229 @@
+"""Negotiated response compression (zstd, brotli, gzip) as pure ASGI middleware.
+
+Bodies are buffered until COMPRESSION_MIN_SIZE bytes have been seen:
+responses that end before that (health checks, single reads, 304s) go
+out untouched. Larger ones are compressed as they stream, with every
+chunk flushed, so NDJSON exports keep arriving incrementally. Responses
+that already carry a Content-Encoding (precompressed static files), event
+streams and non-text types are passed through.
+"""
+from typing import List, Optional, Set
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.metrics import Counter
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Server preference among the encodings a client accepts
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if encoding.strip()
+]
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+)
+SKIPPED_TYPES = ("text/event-stream",)
+
+COMPRESSION_BYTES = Counter(
+    "http_response_compression_bytes_total",
+    "Response bytes before (in) and after (out) compression, by encoding.",
+    ("encoding", "stage"),
+)
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Content codings a client accepts (q > 0) from its Accept-Encoding header.
+
+    A "*" entry is kept as is; use ``accepts`` to test a coding.
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def accepts(accepted: Set[str], encoding: str) -> bool:
+    return encoding in accepted or "*" in accepted
+
+
+class _GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+COMPRESSORS = {"gzip": _GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = _BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _ZstdCompressor
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the first configured and available encoding the client accepts."""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in COMPRESSION_ENCODINGS:
+        if encoding in COMPRESSORS and accepts(accepted, encoding):
+            return encoding
+    return None
+
+
+def is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    if content_type.startswith(SKIPPED_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith("+json")
+
+
+class CompressionMiddleware:
+    """Compress HTTP responses of at least COMPRESSION_MIN_SIZE bytes."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(send, encoding, self.minimum_size).run(self.app, scope, receive)
+
+
+class _CompressedResponse:
+    """State of one response passing through CompressionMiddleware."""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.buffer: List[bytes] = []
+        self.buffered = 0
+        self.compressor = None
+        self.passthrough = False
+
+    async def run(self, app, scope, receive):
+        await app(scope, receive, self.handle)
+
+    async def handle(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = message["status"] in (204, 304) or not is_compressible(headers)
+            if not self.passthrough and "content-length" in headers:
+                self.passthrough = int(headers["content-length"]) < self.minimum_size
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            self.buffer.append(body)
+            self.buffered += len(body)
+            if self.buffered < self.minimum_size:
+                if more_body:
+                    return
+                # Ended below the threshold: send as is
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": b"".join(self.buffer)})
+                return
+            body = b"".join(self.buffer)
+            self.buffer = []
+            await self.begin(streaming=more_body, body=body)
+            return
+        await self.send_compressed(body, more_body)
+
+    async def begin(self, streaming: bool, body: bytes):
+        """Rewrite the headers for the encoded body and send the first part."""
+        self.compressor = COMPRESSORS[self.encoding]()
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # The encoded bytes differ from the identity representation
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if streaming:
+            del headers["Content-Length"]
+            await self.send(self.start)
+            await self.send_compressed(body, True)
+        else:
+            compressed = self.compressor.compress(body) + self.compressor.finish()
+            headers["Content-Length"] = str(len(compressed))
+            self.count(len(body), len(compressed))
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": compressed})
+
+    async def send_compressed(self, body: bytes, more_body: bool):
+        compressed = self.compressor.compress(body) if body else b""
+        if not more_body:
+            compressed += self.compressor.finish()
+        self.count(len(body), len(compressed))
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def count(self, before: int, after: int):
+        COMPRESSION_BYTES.labels(self.encoding, "in").inc(before)
+        COMPRESSION_BYTES.labels(self.encoding, "out").inc(after)
@@ -0,0 +1,71 @@
+"""Strong ETags and conditional GET for calculation reads.
+
+A calculation's ETag is derived from its id and updated_at. A user's
+calculation list is tagged with users.calculations_version, a counter
+every write path bumps in its own transaction via
+bump_calculations_version, so an If-None-Match list request is answered
+from one primary-key lookup without loading or serialising any row.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import User
+
+# Conditional responses must be revalidated, and are never stored by shared caches
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_calculations_version(session: Session, user_id: int) -> int:
+    """Invalidate the user's list ETag; call inside the write's transaction.
+
+    Also takes the user's row lock, so concurrent writers of one user run
+    their stats updates one at a time. The returned version is stamped on
+    the rows the write creates, updates or deletes (as tombstones); since
+    the lock is held until commit, a user's versions commit in order.
+    """
+    return session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(calculations_version=User.calculations_version + 1)
+        .returning(User.calculations_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+
+async def get_calculations_version(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(select(User.calculations_version).where(User.id == user_id))
+
+
+def collection_etag(user_id: int, version: int) -> str:
+    return f'"u{user_id}-v{version}"'
+
+
+def calculation_etag(calculation_id: int, updated_at: datetime) -> str:
+    return f'"c{calculation_id}-{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
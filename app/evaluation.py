@@ -0,0 +1,146 @@
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+
+from app.expressions import compile_expression
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batches then use the scalar loop
+    np = None
+
+# Operations evaluated from operand1/operand2; "expression" evaluates a formula
+OPERATIONS = ("add", "subtract", "multiply", "divide")
+OPERATION_CODES = {operation: code for code, operation in enumerate(OPERATIONS)}
+
+# Below this many items the scalar loop beats NumPy
+# (measured with benchmarks/bench_evaluation.py)
+VECTORIZE_MIN_SIZE = int(os.getenv("VECTORIZE_MIN_SIZE", "512"))
+
+
+def calculate_result(
+    operation: str,
+    operand1: Optional[float],
+    operand2: Optional[float],
+    expression: Optional[str] = None,
+    variables: Optional[Dict[str, float]] = None,
+) -> float:
+    """Perform calculation based on operation."""
+    if operation == "expression":
+        if not expression:
+            raise ValueError("Expression is required for the expression operation")
+        return compile_expression(expression).evaluate(variables or {})
+    if operand1 is None or operand2 is None:
+        raise ValueError("operand1 and operand2 are required")
+    if operation == "add":
+        return operand1 + operand2
+    elif operation == "subtract":
+        return operand1 - operand2
+    elif operation == "multiply":
+        return operand1 * operand2
+    elif operation == "divide":
+        if operand2 == 0:
+            raise ValueError("Cannot divide by zero")
+        return operand1 / operand2
+    else:
+        raise ValueError(f"Invalid operation: {operation}")
+
+
+def _evaluate_scalar(operations, operand1, operand2) -> Tuple[array, bytearray]:
+    """Evaluate item by item with calculate_result.
+    
+    Used for small batches and whenever NumPy is missing: grouping by
+    operation in pure Python costs more than the per-item branch it saves.
+    """
+    results = array("d", bytes(8 * len(operations)))
+    zero_division = bytearray(len(operations))
+    for index, operation in enumerate(operations):
+        if operation == "divide" and operand2[index] == 0:
+            results[index] = float("nan")
+            zero_division[index] = 1
+        else:
+            results[index] = calculate_result(operation, operand1[index], operand2[index])
+    return results, zero_division
+
+
+def _evaluate_numpy(operations, operand1, operand2):
+    """Evaluate group by group with NumPy array arithmetic."""
+    try:
+        codes = np.fromiter(
+            (OPERATION_CODES[operation] for operation in operations),
+            dtype=np.int8, count=len(operations)
+        )
+    except KeyError as e:
+        raise ValueError(f"Invalid operation: {e.args[0]}")
+    a = np.asarray(operand1, dtype=np.float64)
+    b = np.asarray(operand2, dtype=np.float64)
+    results = np.empty(len(operations), dtype=np.float64)
+    zero_division = np.zeros(len(operations), dtype=bool)
+
+    for code, operation in enumerate(OPERATIONS):
+        indices = np.flatnonzero(codes == code)
+        if not len(indices):
+            continue
+        if operation == "add":
+            results[indices] = a[indices] + b[indices]
+        elif operation == "subtract":
+            results[indices] = a[indices] - b[indices]
+        elif operation == "multiply":
+            results[indices] = a[indices] * b[indices]
+        else:
+            divisors = b[indices]
+            zero = divisors == 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                results[indices] = a[indices] / divisors
+            results[indices[zero]] = np.nan
+            zero_division[indices[zero]] = True
+    return results, zero_division
+
+
+def evaluate_calculations(calculations: Sequence) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+    """Evaluate validated calculation objects (e.g. CalculationCreate) together.
+    
+    Arithmetic items go through evaluate_batch; expression items use their
+    cached compiled evaluator. Returns ``(results, errors)`` where each
+    position holds either a result or an error message.
+    """
+    results = [None] * len(calculations)
+    errors = [None] * len(calculations)
+    arithmetic = [i for i, c in enumerate(calculations) if c.operation != "expression"]
+    values, zero_division = evaluate_batch(
+        [calculations[i].operation for i in arithmetic],
+        [calculations[i].operand1 for i in arithmetic],
+        [calculations[i].operand2 for i in arithmetic],
+    )
+    for position, i in enumerate(arithmetic):
+        if zero_division[position]:
+            errors[i] = "Cannot divide by zero"
+        else:
+            results[i] = float(values[position])
+    
+    for i, calculation in enumerate(calculations):
+        if calculation.operation == "expression":
+            try:
+                results[i] = calculate_result(
+                    calculation.operation, None, None, calculation.expression, calculation.variables
+                )
+            except ValueError as e:
+                errors[i] = str(e)
+    return results, errors
+
+
+def evaluate_batch(
+    operations: Sequence[str],
+    operand1: Sequence[float],
+    operand2: Sequence[float],
+):
+    """Evaluate many calculations at once.
+
+    Returns ``(results, zero_division)``: an indexable float sequence and a
+    same-length mask that is truthy where the item divided by zero (its
+    result is NaN). Other results match calculate_result bit for bit.
+    Unknown operations raise ValueError.
+    """
+    if np is None or len(operations) < VECTORIZE_MIN_SIZE:
+        return _evaluate_scalar(operations, operand1, operand2)
+    return _evaluate_numpy(operations, operand1, operand2)
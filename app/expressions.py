@@ -0,0 +1,103 @@
+from functools import lru_cache
+from typing import Dict
+import ast
+import math
+import os
+
+# Number of compiled expressions kept; traffic reuses a small set of formulas
+EXPRESSION_CACHE_SIZE = int(os.getenv("EXPRESSION_CACHE_SIZE", "512"))
+MAX_EXPRESSION_LENGTH = int(os.getenv("MAX_EXPRESSION_LENGTH", "500"))
+
+ALLOWED_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+ALLOWED_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+class CompiledExpression:
+    """An arithmetic expression parsed and checked once, evaluable many times."""
+
+    __slots__ = ("text", "variables", "_code")
+
+    def __init__(self, text: str, variables: frozenset, code):
+        self.text = text
+        self.variables = variables
+        self._code = code
+
+    def evaluate(self, values: Dict[str, float]) -> float:
+        """Evaluate with the given variable values."""
+        missing = self.variables.difference(values)
+        if missing:
+            raise ValueError(f"Missing variables: {', '.join(sorted(missing))}")
+        unknown = set(values).difference(self.variables)
+        if unknown:
+            raise ValueError(f"Unknown variables: {', '.join(sorted(unknown))}")
+        try:
+            result = float(eval(self._code, {"__builtins__": {}}, values))
+        except ZeroDivisionError:
+            raise ValueError("Cannot divide by zero")
+        except OverflowError:
+            raise ValueError("Result is out of range")
+        # Float arithmetic overflows to inf (or inf - inf to nan) without raising
+        if not math.isfinite(result):
+            raise ValueError("Result is out of range")
+        return result
+
+
+class _FloatConstants(ast.NodeTransformer):
+    """Turn numeric literals into floats so evaluation is pure float arithmetic."""
+
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Constant(value=float(node.value)), node)
+
+
+def _check(node: ast.AST, variables: set) -> None:
+    """Reject anything but numbers, variable names, + - * / and parentheses."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ALLOWED_BINARY_OPERATORS):
+        _check(node.left, variables)
+        _check(node.right, variables)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ALLOWED_UNARY_OPERATORS):
+        _check(node.operand, variables)
+    elif isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        pass
+    elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and not node.id.startswith("_"):
+        variables.add(node.id)
+    else:
+        raise ValueError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+
+def normalize_expression(text: str) -> str:
+    """Collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile(text: str) -> CompiledExpression:
+    try:
+        tree = ast.parse(text, mode="eval")
+        variables = set()
+        _check(tree.body, variables)
+        tree = ast.fix_missing_locations(_FloatConstants().visit(tree))
+        code = compile(tree, "<expression>", "eval")
+    except SyntaxError:
+        raise ValueError("Invalid expression syntax")
+    except RecursionError:
+        raise ValueError("Expression is nested too deeply")
+    except OverflowError:
+        # A literal too large for a float, e.g. a 400-digit integer
+        raise ValueError("Number in expression is out of range")
+    return CompiledExpression(text, frozenset(variables), code)
+
+
+def compile_expression(text: str) -> CompiledExpression:
+    """Parse, validate and compile an expression, reusing cached compilations."""
+    text = normalize_expression(text)
+    if not text:
+        raise ValueError("Expression cannot be empty")
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression cannot be longer than {MAX_EXPRESSION_LENGTH} characters")
+    return _compile(text)
+
+
+def expression_cache_stats() -> dict:
+    """Return hit/miss counters of the compiled-expression cache."""
+    info = _compile.cache_info()
+    return {"size": info.currsize, "maxsize": info.maxsize, "hits": info.hits, "misses": info.misses}
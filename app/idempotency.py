@@ -0,0 +1,153 @@
+"""Idempotency-Key support for POST /calculations and /calculations/batch.
+
+A client that retries a write with the same Idempotency-Key header gets
+the stored response back (with Idempotent-Replayed: true) and nothing is
+computed or written again. Reusing a key for a different request is
+rejected with 422.
+
+Responses live in an in-process TTL cache, so a retry normally costs no
+query at all, and in the idempotency_keys table. That row is inserted in
+the same transaction as the calculations, so the first write adds no
+extra round trip. A retry that reaches another worker, or arrives after
+a restart, or runs concurrently with the original, conflicts on the
+(user_id, key) primary key. Its transaction is then rolled back and the
+stored response is replayed instead. Keys are kept for
+IDEMPOTENCY_KEY_TTL_HOURS; remove older rows with:
+
+    python -m app.idempotency purge
+"""
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.database import IdempotencyKey, SessionLocal, create_tables
+from app.metrics import Counter
+
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+idempotency_cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_KEY_TTL_HOURS * 3600)
+
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total",
+    "Requests carrying an Idempotency-Key, by outcome (stored, replayed_cache, replayed_db, conflict).",
+    ("result",),
+)
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: bytes
+
+
+def request_fingerprint(path: str, payload) -> str:
+    """Hash a request path and its (JSON-compatible) body independently of key order."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{path}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _respond(stored: StoredResponse, replayed: bool) -> Response:
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(
+        content=stored.body, status_code=stored.status_code, media_type="application/json", headers=headers
+    )
+
+
+def _replay(stored: StoredResponse, fingerprint: str, result: str) -> Response:
+    if stored.fingerprint != fingerprint:
+        IDEMPOTENT_REQUESTS.labels("conflict").inc()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    IDEMPOTENT_REQUESTS.labels(result).inc()
+    return _respond(stored, replayed=True)
+
+
+def save_response(session: Session, user_id: int, key: str, stored: StoredResponse) -> None:
+    session.execute(insert(IdempotencyKey).values(
+        user_id=user_id, key=key, fingerprint=stored.fingerprint,
+        status_code=stored.status_code, body=stored.body.decode("utf-8"),
+    ))
+
+
+async def load_response(db: AsyncSession, user_id: int, key: str) -> Optional[StoredResponse]:
+    row = (await db.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+    )).first()
+    if row is None:
+        return None
+    return StoredResponse(row.fingerprint, row.status_code, row.body.encode("utf-8"))
+
+
+async def run_idempotent(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    fingerprint: str,
+    write: Callable[[], Awaitable[Tuple[int, bytes]]],
+) -> Response:
+    """Run ``write`` once per (user, key) and commit; replay its response afterwards.
+
+    ``write`` does the request's work in ``db`` without committing and
+    returns the status code and JSON body to store.
+    """
+    cache_key = (user_id, key)
+    stored = idempotency_cache.get(cache_key)
+    if stored is not None:
+        return _replay(stored, fingerprint, "replayed_cache")
+
+    status_code, body = await write()
+    stored = StoredResponse(fingerprint, status_code, body)
+    try:
+        await db.run_sync(save_response, user_id, key, stored)
+        await db.commit()
+    except IntegrityError:
+        # Stored by another worker or an earlier run: drop this attempt's writes
+        await db.rollback()
+        existing = await load_response(db, user_id, key)
+        if existing is None:
+            raise
+        idempotency_cache.set(cache_key, existing)
+        return _replay(existing, fingerprint, "replayed_db")
+
+    idempotency_cache.set(cache_key, stored)
+    IDEMPOTENT_REQUESTS.labels("stored").inc()
+    return _respond(stored, replayed=False)
+
+
+def purge_expired(session: Session) -> int:
+    """Delete stored responses older than IDEMPOTENCY_KEY_TTL_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    return session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the idempotency_keys table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("purge", help=f"Delete keys older than {IDEMPOTENCY_KEY_TTL_HOURS:g} hours")
+    parser.parse_args()
+
+    create_tables()
+    with SessionLocal() as session:
+        rows = purge_expired(session)
+        session.commit()
+    print(f"Purged {rows} expired idempotency keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Body, Header, Query
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import timedelta
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+import base64
+import binascii
+import csv
+import io
+import json
 import os
+import time
 import traceback
 
-from app.database import get_db, create_tables, User, Calculation
+from app.database import (
+    get_db, get_pool_stats, create_tables, DATABASE_ASYNC, SessionLocal, engine, User, Calculation, CalculationStat
+)
 from app.schemas import (
-    UserCreate, UserResponse, Token,
-    CalculationCreate, CalculationUpdate, CalculationResponse
+    UserCreate, UserResponse, Token, RefreshTokenRequest, AuthenticatedUser,
+    CalculationCreate, CalculationUpdate, CalculationResponse,
+    CalculationBatchError, CalculationBatchResponse,
+    CalculationImportError, CalculationImportSummary, CalculationChangesResponse,
+    OperationStats, CalculationStatsResponse
+)
+from app.evaluation import calculate_result, evaluate_calculations
+from app.expressions import expression_cache_stats
+from app.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, CallbackMetric, MetricsMiddleware
+from app.stats import record_added, record_removed
+from app.assets import INDEX_NAME, create_static_app
+from app.compression import CompressionMiddleware
+from app.responses import DefaultResponse, RESPONSE_COLUMNS, dump_json, row_response, rows_response
+from app.etags import (
+    bump_calculations_version, get_calculations_version, collection_etag, calculation_etag,
+    etag_matches, not_modified, set_etag
 )
+from app.changes import CHANGES_PAGE_SIZE, load_changes, record_tombstones
+from app.changefeed import change_feed, record_calculations, record_deleted, record_reset, stream_events
+from app.bulk_import import LineTooLongError, copy_calculations, iter_lines, parse_csv_line
 from app.auth import (
-    get_password_hash, authenticate_user, create_access_token,
+    get_password_hash_async, authenticate_user, create_access_token,
     get_current_user, get_user_by_username, get_user_by_email,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    auth_cache, hash_pool_stats, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from app.idempotency import MAX_IDEMPOTENCY_KEY_LENGTH, request_fingerprint, run_idempotent
+from app.ratelimit import limit_login, limit_register
+from app.writebehind import WRITE_BEHIND_ENABLED, WriteBehindQueue
+from app.tokens import (
+    TOKEN_REFRESHES, decode_refresh_token, issue_refresh_token, load_revoked, revoke_family,
+    revoked_tokens, rotate_refresh_token
 )
 
+# Maximum number of items accepted by POST /calculations/batch
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+
+# Rows fetched per server-side cursor round trip by GET /calculations/export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# POST /calculations/import: rows per COPY/commit, longest accepted line,
+# and how many row-level errors are listed in the summary
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", "65536"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+# Group commits for POST /calculations (see app/writebehind.py)
+write_behind = WriteBehindQueue(SessionLocal) if WRITE_BEHIND_ENABLED else None
+
 # Create FastAPI app
-app = FastAPI(title="Calculations API", version="1.0.0")
+app = FastAPI(title="Calculations API", version="1.0.0", default_response_class=DefaultResponse)
+# Added first so it runs inside MetricsMiddleware: recorded latency includes compression
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Global exception handler to ensure JSON responses
 @app.exception_handler(Exception)
@@ -39,8 +90,9 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files (fingerprinted and precompressed after `python -m app.assets build`)
+static_app = create_static_app()
+app.mount("/static", static_app, name="static")
 
 # Create database tables on startup
 @app.on_event("startup")
@@ -49,11 +101,23 @@ def startup_event():
         print("Creating database tables...")
         create_tables()
         print("Database tables created successfully!")
+        with SessionLocal() as session:
+            print(f"Loaded {load_revoked(session)} revoked refresh tokens")
+        change_feed.start(engine)
     except Exception as e:
         print(f"Error creating database tables: {str(e)}")
         raise
 
 
+# Commit queued write-behind rows before the process exits
+@app.on_event("shutdown")
+async def shutdown_event():
+    if write_behind is not None:
+        print(f"Draining {write_behind.pending()} write-behind rows...")
+        await write_behind.drain()
+    change_feed.stop()
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -61,19 +125,107 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# Authentication internals
+@app.get("/health/auth")
+async def auth_health():
+    """Report authenticated-user cache counters and password pool queue depth."""
+    return {
+        "user_cache": auth_cache.stats(),
+        "revoked_refresh_tokens": revoked_tokens.stats(),
+        "password_hashing": hash_pool_stats(),
+    }
+
+
+# Existing stats, sampled when /metrics is scraped
+def _pool_connection_samples():
+    for engine_name, pool in get_pool_stats().items():
+        for state in ("checked_out", "idle", "overflow"):
+            yield (engine_name, state), pool.get(state)
+
+
+def _cache_request_samples():
+    for cache_name, stats in (("auth", auth_cache.stats()), ("expression", expression_cache_stats())):
+        yield (cache_name, "hit"), stats["hits"]
+        yield (cache_name, "miss"), stats["misses"]
+
+
+CallbackMetric(
+    "db_pool_connections", "Pooled database connections by engine and state.",
+    ("engine", "state"), _pool_connection_samples,
+)
+CallbackMetric(
+    "db_pool_checkout_timeouts_total", "Connection checkouts that timed out waiting for the pool.",
+    ("engine",), lambda: (((name,), pool["timeouts"]) for name, pool in get_pool_stats().items()),
+    kind="counter",
+)
+CallbackMetric(
+    "cache_requests_total", "Lookups in the in-process caches by result.",
+    ("cache", "result"), _cache_request_samples, kind="counter",
+)
+CallbackMetric(
+    "password_hash_jobs", "Password hashing pool jobs by state.",
+    ("state",), lambda: (((state,), hash_pool_stats()[state]) for state in ("queued", "running")),
+)
+CallbackMetric(
+    "write_behind_pending_rows", "Calculations queued for the next write-behind group commit.",
+    (), lambda: [((), write_behind.pending())] if write_behind is not None else [],
+)
+CallbackMetric(
+    "change_feed_subscribers", "Open GET /calculations/stream connections.",
+    (), lambda: [((), change_feed.subscriber_count())],
+)
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose request, database, password hashing and cache metrics in the Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+# Compiled-expression cache usage
+@app.get("/health/expressions")
+async def expressions_health():
+    """Report hit/miss counters of the compiled-expression LRU cache."""
+    return {"expression_cache": expression_cache_stats()}
+
+
+# Database connectivity and connection pool usage
+@app.get("/health/db")
+async def db_health(db: AsyncSession = Depends(get_db)):
+    """Ping the database and report connection pool occupancy and checkout wait times."""
+    started = time.perf_counter()
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "error": str(e), "pools": get_pool_stats()}
+        )
+    return {
+        "status": "healthy",
+        "mode": "async" if DATABASE_ASYNC else "sync",
+        "ping_ms": (time.perf_counter() - started) * 1000,
+        "pools": get_pool_stats(),
+    }
+
+
 # Root endpoint
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    """Serve the main page."""
-    return FileResponse("static/index.html")
+async def root(request: Request):
+    """Serve the main page (always revalidated, so new asset builds are picked up)."""
+    return await static_app.get_response(INDEX_NAME, request.scope)
 
 
 # User Registration
-@app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user."""
+@app.post(
+    "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(limit_register)],
+)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    """Register a new user (rate limited per client IP before any lookup or hashing)."""
     # Check if username already exists
-    db_user = get_user_by_username(db, user.username)
+    db_user = await get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -81,31 +233,31 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Check if email already exists
-    db_user = get_user_by_email(db, user.email)
+    db_user = await get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+    # Create new user (bcrypt runs on the password hashing pool)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
 # User Login
-@app.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    """Login and get access token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+@app.post("/token", response_model=Token, dependencies=[Depends(limit_login)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    """Login and get access token (rate limited per client IP and username before bcrypt runs)."""
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -113,135 +265,640 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Also saves the password hash if authenticate_user upgraded it
+    refresh_token = await db.run_sync(issue_refresh_token, user.id, user.username)
+    await db.commit()
+    return token_response(user.username, refresh_token)
+
+
+def token_response(username: str, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+# Token refresh
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    
+    No password is checked, so this is far cheaper than POST /token.
+    
+    - **refresh_token**: Single use; the response carries its replacement.
+      Presenting a token that was already used revokes every token of
+      that login.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or revoked refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    claims = decode_refresh_token(body.refresh_token)
+    if claims is None:
+        TOKEN_REFRESHES.labels("invalid").inc()
+        raise credentials_exception
+    refresh_token = await db.run_sync(rotate_refresh_token, claims)
+    await db.commit()
+    if refresh_token is None:
+        raise credentials_exception
+    return token_response(claims["sub"], refresh_token)
+
+
+# Logout: revoke a refresh token
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(body: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Revoke a refresh token and every token rotated from the same login.
+    
+    - **refresh_token**: Any token of the login; unknown or expired tokens are ignored
+    """
+    claims = decode_refresh_token(body.refresh_token)
+    if claims is not None:
+        await db.run_sync(revoke_family, claims["fam"], claims["exp"])
+        await db.commit()
+    return None
 
 
 # Get current user
 @app.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: AuthenticatedUser = Depends(get_current_user)):
     """Get current user information."""
     return current_user
 
 
 # ===== BREAD ENDPOINTS FOR CALCULATIONS =====
 
-def calculate_result(operation: str, operand1: float, operand2: float) -> float:
-    """Perform calculation based on operation."""
-    if operation == "add":
-        return operand1 + operand2
-    elif operation == "subtract":
-        return operand1 - operand2
-    elif operation == "multiply":
-        return operand1 * operand2
-    elif operation == "divide":
-        if operand2 == 0:
-            raise ValueError("Cannot divide by zero")
-        return operand1 / operand2
-    else:
-        raise ValueError(f"Invalid operation: {operation}")
+def encode_cursor(last_id: int) -> str:
+    """Encode the last seen calculation id as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a pagination cursor back into the last seen calculation id."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
 
 
 # Browse - GET all calculations for current user
 @app.get("/calculations", response_model=List[CalculationResponse])
-def browse_calculations(
+async def browse_calculations(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    after: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Retrieve all calculations belonging to the logged-in user.
+    Retrieve all calculations belonging to the logged-in user, ordered by id.
     
     - **skip**: Number of records to skip (for pagination)
     - **limit**: Maximum number of records to return
+    - **after**: Opaque cursor from the previous page's `X-Next-Cursor` header.
+      When given, the page is fetched by seeking past the cursor instead of
+      using `skip`, so deep pages cost the same as the first one.
+    
+    The response carries an `ETag` that changes whenever any of the user's
+    calculations is written; sending it back in `If-None-Match` returns
+    `304 Not Modified` without reading the calculations.
+    """
+    # Read the version before the rows: a concurrent write can only make the tag stale
+    etag = collection_etag(current_user.id, await get_calculations_version(db, current_user.id))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    query = select(*RESPONSE_COLUMNS).where(
+        Calculation.user_id == current_user.id
+    ).order_by(Calculation.id)
+    
+    if after is not None:
+        query = query.where(Calculation.id > decode_cursor(after))
+    else:
+        query = query.offset(skip)
+    
+    # Rows are encoded directly, without re-validating them as CalculationResponse
+    rows = (await db.execute(query.limit(limit))).all()
+    page = rows_response(rows)
+    set_etag(page, etag)
+    if limit > 0 and len(rows) == limit:
+        page.headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+    return page
+
+
+EXPORT_COLUMNS = (
+    Calculation.id,
+    Calculation.operation,
+    Calculation.operand1,
+    Calculation.operand2,
+    Calculation.expression,
+    Calculation.variables,
+    Calculation.result,
+    Calculation.created_at,
+    Calculation.updated_at,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+def encode_ndjson_rows(rows) -> bytes:
+    """Encode exported rows as newline-delimited JSON."""
+    return b"".join(dump_json(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in rows)
+
+
+def encode_csv_value(value):
+    """Render one exported value as a CSV field (JSON for variables)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def encode_csv_rows(rows) -> str:
+    """Encode exported rows as CSV lines."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([encode_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+# Stats - GET aggregate statistics for current user
+@app.get("/calculations/stats", response_model=CalculationStatsResponse)
+async def calculation_stats(
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Per-operation counts, sum, min/max/average of results and last activity.
+    
+    Served from the calculation_stats summary table (one row per operation),
+    so the cost does not depend on how many calculations the user has.
+    """
+    stats = (await db.scalars(select(CalculationStat).where(
+        CalculationStat.user_id == current_user.id
+    ))).all()
+    
+    operations = {
+        stat.operation: OperationStats(
+            count=stat.count,
+            total=stat.total,
+            min_result=stat.min_result,
+            max_result=stat.max_result,
+            average=stat.total / stat.count if stat.count else None,
+            last_activity=stat.last_activity
+        )
+        for stat in stats
+    }
+    active = [stat for stat in operations.values() if stat.count]
+    count = sum(stat.count for stat in active)
+    total = sum(stat.total for stat in active)
+    return CalculationStatsResponse(
+        count=count,
+        total=total,
+        min_result=min((stat.min_result for stat in active), default=None),
+        max_result=max((stat.max_result for stat in active), default=None),
+        average=total / count if count else None,
+        last_activity=max((stat.last_activity for stat in operations.values() if stat.last_activity), default=None),
+        operations=operations
+    )
+
+
+# Export - GET the full calculation history as a stream
+@app.get("/calculations/export")
+async def export_calculations(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream every calculation of the logged-in user, ordered by id.
+    
+    - **format**: `ndjson` (one JSON object per line) or `csv`
+    
+    Rows are read through a server-side cursor in chunks of
+    EXPORT_CHUNK_SIZE, so memory use does not grow with history size.
     """
-    calculations = db.query(Calculation).filter(
+    query = select(*EXPORT_COLUMNS).where(
         Calculation.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    return calculations
+    ).order_by(Calculation.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    result = await db.stream(query)
+    
+    if export_format == "csv":
+        encode, media_type = encode_csv_rows, "text/csv"
+    else:
+        encode, media_type = encode_ndjson_rows, "application/x-ndjson"
+    
+    async def generate():
+        try:
+            if export_format == "csv":
+                yield ",".join(EXPORT_FIELDS) + "\r\n"
+            async for rows in result.partitions(EXPORT_CHUNK_SIZE):
+                yield encode(rows)
+        finally:
+            await result.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="calculations.{export_format}"'}
+    )
+
+
+# Stream - GET live changes of the user's calculations as Server-Sent Events
+@app.get("/calculations/stream")
+async def stream_calculation_changes(
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Push every committed change of the logged-in user's calculations.
+
+    Each event is one `data:` line holding JSON:
+    - `{"type": "created" | "updated", "calculations": [...]}`
+    - `{"type": "deleted", "ids": [...]}`
+    - `{"type": "reset"}`: events were skipped (bulk import, slow reader,
+      lost connection); reload the list
+
+    Changes made before the stream opened are not replayed, so load the list
+    after connecting. Idle streams get a comment line every
+    CHANGE_FEED_KEEPALIVE_SECONDS. The stream ends after
+    ACCESS_TOKEN_EXPIRE_MINUTES; reconnect with a current token.
+    """
+    # get_db is only torn down after the response ends: release the session
+    # authentication used now, or every stream pins a pooled connection
+    await db.close()
+    return StreamingResponse(
+        stream_events(current_user.id, ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+        media_type="text/event-stream",
+        # No caching, and no buffering by nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Changes - GET rows and tombstones written since a version (delta sync)
+@app.get("/calculations/changes", response_model=CalculationChangesResponse)
+async def read_calculation_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Return what changed in the logged-in user's calculations after a version.
+
+    - **since**: `version` returned by the previous sync (0 for a full sync)
+    - **limit**: Rows per page; rows written together are never split, so a page may hold more
+
+    The response lists created or updated `calculations` and the ids of
+    `deleted` ones. Store `version` and pass it as `since` next time; while
+    `has_more` is true, sync again at once. 410 Gone means the tombstones
+    the client needs were purged: sync again from since=0.
+    """
+    changes = await load_changes(db, current_user.id, since, limit)
+    return Response(content=dump_json(changes), media_type="application/json")
 
 
 # Read - GET a specific calculation by ID
 @app.get("/calculations/{calculation_id}", response_model=CalculationResponse)
-def read_calculation(
+async def read_calculation(
     calculation_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Retrieve details of a specific calculation by its ID.
     
     - **calculation_id**: The ID of the calculation to retrieve
+    
+    The `ETag` is derived from the id and `updated_at`; a matching
+    `If-None-Match` returns `304 Not Modified` after reading only `updated_at`.
     """
-    calculation = db.query(Calculation).filter(
-        Calculation.id == calculation_id,
-        Calculation.user_id == current_user.id
-    ).first()
+    owned = (Calculation.id == calculation_id, Calculation.user_id == current_user.id)
+    if if_none_match:
+        updated_at = await db.scalar(select(Calculation.updated_at).where(*owned))
+        if updated_at is not None and etag_matches(if_none_match, calculation_etag(calculation_id, updated_at)):
+            return not_modified(calculation_etag(calculation_id, updated_at))
     
-    if not calculation:
+    row = (await db.execute(select(*RESPONSE_COLUMNS).where(*owned))).first()
+    
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Calculation not found"
         )
     
-    return calculation
+    body = row_response(row)
+    set_etag(body, calculation_etag(row.id, row.updated_at))
+    return body
 
 
 # Add - POST a new calculation
 @app.post("/calculations", response_model=CalculationResponse, status_code=status.HTTP_201_CREATED)
-def add_calculation(
+async def add_calculation(
     calculation: CalculationCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new calculation by specifying the operation and operands.
     
-    - **operation**: The operation to perform (add, subtract, multiply, divide)
+    - **operation**: The operation to perform (add, subtract, multiply, divide, expression)
     - **operand1**: The first operand
     - **operand2**: The second operand
+    - **expression**: Formula for the expression operation, e.g. `(a + b) * c / 2`
+    - **variables**: Values for the formula's variables, e.g. `{"a": 1, "b": 2, "c": 3}`
+    - **Idempotency-Key** (header, optional): Retries with the same key get the
+      first response back (`Idempotent-Replayed: true`) instead of a new row
     """
-    try:
-        # Calculate the result
-        result = calculate_result(
-            calculation.operation,
-            calculation.operand1,
-            calculation.operand2
-        )
-        
+    def compute() -> float:
+        try:
+            # Calculate the result
+            return calculate_result(
+                calculation.operation,
+                calculation.operand1,
+                calculation.operand2,
+                calculation.expression,
+                calculation.variables
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    if write_behind is not None and idempotency_key is None:
+        # Answered once the group commit holding this row has succeeded
+        return await write_behind.submit({
+            "operation": calculation.operation,
+            "operand1": calculation.operand1,
+            "operand2": calculation.operand2,
+            "expression": calculation.expression,
+            "variables": calculation.variables,
+            "result": compute(),
+            "user_id": current_user.id
+        })
+    
+    # Computed inside write, so a replayed Idempotency-Key skips the work
+    async def write() -> Calculation:
+        result = compute()
+        version = await db.run_sync(bump_calculations_version, current_user.id)
         # Create new calculation
         db_calculation = Calculation(
             operation=calculation.operation,
             operand1=calculation.operand1,
             operand2=calculation.operand2,
+            expression=calculation.expression,
+            variables=calculation.variables,
             result=result,
-            user_id=current_user.id
+            user_id=current_user.id,
+            version=version
         )
         
         db.add(db_calculation)
-        db.commit()
-        db.refresh(db_calculation)
+        await db.run_sync(
+            record_added, current_user.id, [(calculation.operation, result)], datetime.utcnow()
+        )
+        await db.flush()
+        await db.run_sync(record_calculations, current_user.id, "created", [db_calculation])
         return db_calculation
+    
+    if idempotency_key is None:
+        db_calculation = await write()
+        await db.commit()
+        await db.refresh(db_calculation)
+        return db_calculation
+    
+    async def write_stored():
+        db_calculation = await write()
+        body = dump_json(CalculationResponse.model_validate(db_calculation).model_dump())
+        return status.HTTP_201_CREATED, body
+    
+    fingerprint = request_fingerprint("/calculations", calculation.model_dump())
+    return await run_idempotent(db, current_user.id, idempotency_key, fingerprint, write_stored)
+
+
+# Batch Add - POST many calculations in a single transaction
+@app.post("/calculations/batch", response_model=CalculationBatchResponse)
+async def add_calculations_batch(
+    items: List[Dict[str, Any]] = Body(..., description="List of calculations to create"),
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=MAX_IDEMPOTENCY_KEY_LENGTH),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create many calculations at once.
+    
+    Every item is validated and computed independently. Valid items are
+    inserted together with one bulk INSERT ... RETURNING and one commit;
+    invalid items are reported in **errors** by their index without
+    aborting the rest of the batch.
+    
+    - **Idempotency-Key** (header, optional): Retries with the same key get the
+      first response back (`Idempotent-Replayed: true`) instead of new rows
+    """
+    if len(items) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch cannot contain more than {BATCH_MAX_SIZE} items"
+        )
+    
+    async def write() -> CalculationBatchResponse:
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, CalculationCreate.model_validate(item)))
+            except ValidationError as e:
+                detail = "; ".join(error["msg"] for error in e.errors())
+                errors.append(CalculationBatchError(index=index, detail=detail))
         
-    except ValueError as e:
+        # Compute all results together
+        results, result_errors = evaluate_calculations([calculation for _, calculation in valid])
+        rows = []
+        for position, (index, calculation) in enumerate(valid):
+            if result_errors[position]:
+                errors.append(CalculationBatchError(index=index, detail=result_errors[position]))
+                continue
+            rows.append({
+                "operation": calculation.operation,
+                "operand1": calculation.operand1,
+                "operand2": calculation.operand2,
+                "expression": calculation.expression,
+                "variables": calculation.variables,
+                "result": results[position],
+                "user_id": current_user.id
+            })
+        errors.sort(key=lambda error: error.index)
+        
+        created = []
+        if rows:
+            version = await db.run_sync(bump_calculations_version, current_user.id)
+            for row in rows:
+                row["version"] = version
+            db_calculations = (await db.scalars(
+                insert(Calculation).returning(Calculation, sort_by_parameter_order=True),
+                rows
+            )).all()
+            # Serialize before commit so expired attributes are not reloaded row by row
+            created = [CalculationResponse.model_validate(c) for c in db_calculations]
+            await db.run_sync(
+                record_added, current_user.id,
+                [(row["operation"], row["result"]) for row in rows], datetime.utcnow()
+            )
+            await db.run_sync(record_calculations, current_user.id, "created", created)
+        return CalculationBatchResponse(created=created, errors=errors)
+    
+    if idempotency_key is None:
+        response = await write()
+        await db.commit()
+        return response
+    
+    async def write_stored():
+        return status.HTTP_200_OK, dump_json((await write()).model_dump())
+    
+    fingerprint = request_fingerprint("/calculations/batch", items)
+    return await run_idempotent(db, current_user.id, idempotency_key, fingerprint, write_stored)
+
+
+async def load_import_chunk(db: AsyncSession, user_id: int, pending: list) -> list:
+    """Compute results for a chunk of validated rows and load them in one transaction.
+    
+    Returns the (line, detail) pairs of rows whose result could not be computed.
+    """
+    now = datetime.utcnow()
+    results, result_errors = evaluate_calculations([calculation for _, calculation in pending])
+    rows = []
+    errors = []
+    for position, (line_number, calculation) in enumerate(pending):
+        if result_errors[position]:
+            errors.append((line_number, result_errors[position]))
+            continue
+        rows.append({
+            "operation": calculation.operation,
+            "operand1": calculation.operand1,
+            "operand2": calculation.operand2,
+            "expression": calculation.expression,
+            "variables": calculation.variables,
+            "result": results[position],
+            "user_id": user_id,
+            "created_at": now,
+            "updated_at": now,
+        })
+    if rows:
+        def load_rows(session):
+            # Version and stats first: they open the transaction the COPY then joins
+            version = bump_calculations_version(session, user_id)
+            for row in rows:
+                row["version"] = version
+            record_added(session, user_id, [(row["operation"], row["result"]) for row in rows], now)
+            copy_calculations(session, rows)
+            # One reset per chunk rather than an event per imported row
+            record_reset(session, user_id)
+        
+        await db.run_sync(load_rows)
+        await db.commit()
+    return errors
+
+
+# Import - POST a CSV or NDJSON body of calculations
+@app.post("/calculations/import", response_model=CalculationImportSummary)
+async def import_calculations(
+    request: Request,
+    import_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk-load calculations from a streamed request body.
+    
+    - **format**: `ndjson` (one calculation object per line) or `csv`
+      (header line with at least operation, operand1, operand2)
+    
+    Rows are validated as they arrive with the same rules as
+    `POST /calculations`, then computed and loaded IMPORT_CHUNK_SIZE rows at a
+    time (COPY on Postgres, executemany elsewhere), one commit per chunk.
+    Memory is bounded by the chunk size, not by the upload size.
+    """
+    imported = 0
+    failed = 0
+    errors = []
+    pending = []
+    header = None
+    
+    def record_error(line_number: int, detail: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append(CalculationImportError(line=line_number, detail=detail))
+    
+    async def flush():
+        nonlocal imported
+        chunk_errors = await load_import_chunk(db, current_user.id, pending)
+        imported += len(pending) - len(chunk_errors)
+        for line_number, detail in chunk_errors:
+            record_error(line_number, detail)
+        pending.clear()
+    
+    line_number = 0
+    try:
+        async for raw_line in iter_lines(request.stream(), IMPORT_MAX_LINE_BYTES):
+            line_number += 1
+            if not raw_line.strip():
+                continue
+            try:
+                # UnicodeDecodeError is a ValueError: reported for this line only
+                line = raw_line.decode("utf-8")
+                if import_format == "csv":
+                    if header is None:
+                        header = [column.strip() for column in next(csv.reader([line]))]
+                        continue
+                    item = parse_csv_line(line, header)
+                else:
+                    item = json.loads(line)
+                pending.append((line_number, CalculationCreate.model_validate(item)))
+            except ValidationError as e:
+                record_error(line_number, "; ".join(error["msg"] for error in e.errors()))
+            except ValueError as e:
+                record_error(line_number, str(e))
+            
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        await flush()
+    except LineTooLongError as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{e} (line {line_number + 1}); {imported} rows were imported before it"
         )
+    
+    return CalculationImportSummary(
+        imported=imported,
+        failed=failed,
+        errors=errors,
+        errors_truncated=failed > len(errors)
+    )
 
 
 # Edit - PUT/PATCH update an existing calculation
 @app.put("/calculations/{calculation_id}", response_model=CalculationResponse)
 @app.patch("/calculations/{calculation_id}", response_model=CalculationResponse)
-def edit_calculation(
+async def edit_calculation(
     calculation_id: int,
     calculation_update: CalculationUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update fields of an existing calculation.
@@ -250,12 +907,14 @@ def edit_calculation(
     - **operation**: (optional) New operation
     - **operand1**: (optional) New first operand
     - **operand2**: (optional) New second operand
+    - **expression**: (optional) New formula
+    - **variables**: (optional) New formula variables
     """
     # Get the calculation
-    db_calculation = db.query(Calculation).filter(
+    db_calculation = await db.scalar(select(Calculation).where(
         Calculation.id == calculation_id,
         Calculation.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_calculation:
         raise HTTPException(
@@ -264,7 +923,7 @@ def edit_calculation(
         )
     
     # Update fields if provided
-    update_data = calculation_update.dict(exclude_unset=True)
+    update_data = calculation_update.model_dump(exclude_unset=True)
     
     if not update_data:
         raise HTTPException(
@@ -272,15 +931,21 @@ def edit_calculation(
             detail="No fields to update"
         )
     
+    previous = (db_calculation.operation, db_calculation.result)
     for field, value in update_data.items():
         setattr(db_calculation, field, value)
+    if db_calculation.operation != "expression":
+        db_calculation.expression = None
+        db_calculation.variables = None
     
     # Recalculate result
     try:
         db_calculation.result = calculate_result(
             db_calculation.operation,
             db_calculation.operand1,
-            db_calculation.operand2
+            db_calculation.operand2,
+            db_calculation.expression,
+            db_calculation.variables
         )
     except ValueError as e:
         raise HTTPException(
@@ -288,27 +953,37 @@ def edit_calculation(
             detail=str(e)
         )
     
-    db.commit()
-    db.refresh(db_calculation)
+    db_calculation.version = await db.run_sync(bump_calculations_version, current_user.id)
+    
+    # Move the row from its old to its new place in the stats
+    await db.flush()
+    now = datetime.utcnow()
+    await db.run_sync(record_removed, current_user.id, *previous, now)
+    await db.run_sync(
+        record_added, current_user.id, [(db_calculation.operation, db_calculation.result)], now
+    )
+    await db.run_sync(record_calculations, current_user.id, "updated", [db_calculation])
+    await db.commit()
+    await db.refresh(db_calculation)
     return db_calculation
 
 
 # Delete - DELETE a calculation
 @app.delete("/calculations/{calculation_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_calculation(
+async def delete_calculation(
     calculation_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Remove a calculation by its ID.
     
     - **calculation_id**: The ID of the calculation to delete
     """
-    db_calculation = db.query(Calculation).filter(
+    db_calculation = await db.scalar(select(Calculation).where(
         Calculation.id == calculation_id,
         Calculation.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_calculation:
         raise HTTPException(
@@ -316,8 +991,16 @@ def delete_calculation(
             detail="Calculation not found"
         )
     
-    db.delete(db_calculation)
-    db.commit()
+    version = await db.run_sync(bump_calculations_version, current_user.id)
+    await db.delete(db_calculation)
+    await db.flush()
+    await db.run_sync(record_tombstones, current_user.id, [calculation_id], version)
+    await db.run_sync(
+        record_removed, current_user.id, db_calculation.operation, db_calculation.result,
+        datetime.utcnow()
+    )
+    await db.run_sync(record_deleted, current_user.id, [calculation_id])
+    await db.commit()
     return None
 
 
@@ -0,0 +1,282 @@
+"""In-process metrics exposed in the Prometheus text format at GET /metrics.
+
+Recording is a dict lookup for the label set plus a few list updates in a
+per-thread shard, with no lock, so instrumentation stays enabled in
+production (see ``python -m benchmarks.bench_metrics`` for the cost).
+Values are per worker process; scrape every worker or aggregate downstream.
+"""
+from bisect import bisect_left
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond DB statements up to slow exports
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """Return the child for one label set, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class _ShardedChild:
+    """Values kept in one slot list per thread.
+
+    Each thread only writes its own list, so recording needs no lock (a
+    lock costs more than the rest of an observation); scrapes add the
+    lists up and may be a few observations behind.
+    """
+
+    __slots__ = ("_shards", "_width")
+
+    def __init__(self, width: int):
+        self._shards: Dict[int, list] = {}
+        self._width = width
+
+    def _new_shard(self) -> list:
+        return self._shards.setdefault(get_ident(), [0] * self._width)
+
+    def totals(self) -> list:
+        totals = [0] * self._width
+        for shard in list(self._shards.values()):
+            for index, value in enumerate(shard):
+                totals[index] += value
+        return totals
+
+
+class _ValueChild(_ShardedChild):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        shard = self._shards.get(get_ident()) or self._new_shard()
+        shard[0] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        shard = self._shards.get(get_ident()) or self._new_shard()
+        shard[0] -= amount
+
+    @property
+    def value(self) -> float:
+        return self.totals()[0]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down (absolute values belong in a CallbackMetric)."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _HistogramChild(_ShardedChild):
+    """Bucket counts followed by the running sum in the last slot."""
+
+    __slots__ = ("_upper",)
+
+    def __init__(self, upper: Tuple[float, ...]):
+        super().__init__(len(upper) + 2)
+        self._upper = upper
+
+    def observe(self, value: float) -> None:
+        shard = self._shards.get(get_ident()) or self._new_shard()
+        shard[bisect_left(self._upper, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        totals = self.totals()
+        return totals[:-1], totals[-1]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples are read from existing stats at scrape time.
+
+    ``callback`` returns (label values, value) pairs.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+                 kind: str = "gauge", registry: Registry = REGISTRY):
+        self.callback = callback
+        self.kind = kind
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self):
+        for values, value in self.callback():
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the last body byte is sent.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording in-flight requests and latency per route and status.
+
+    The route label is the path template ("/calculations/{calculation_id}"),
+    so IDs in URLs do not create new series; unknown paths share "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_label(self, scope) -> str:
+        if self._route_paths is None:
+            routes = scope["app"].routes
+            self._route_paths = {}
+            for route in routes:
+                endpoint = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                self._route_paths.setdefault(endpoint, route.path)
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+        in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], self._route_label(scope), str(status_code)
+            ).observe(time.perf_counter() - started_at)
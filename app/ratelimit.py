@@ -0,0 +1,202 @@
+"""Token-bucket rate limiting for the password hashing endpoints.
+
+POST /token is limited per client IP and per username, POST /register per
+client IP. The limits run as route dependencies, so a limited request is
+answered with 429 and Retry-After before any bcrypt work or user lookup.
+Each check takes O(1) time.
+
+Buckets live in a backend:
+  memory    (default) per-process dicts split into lock-protected shards
+            (bounded LRU: an evicted key starts again with a full bucket)
+  database  one row per key in rate_limit_buckets, updated with a single
+            atomic upsert, so every worker and host shares the limits
+
+Behind a reverse proxy, run uvicorn with --proxy-headers so the client IP
+is taken from X-Forwarded-For. Idle database buckets are removed with:
+
+    python -m app.ratelimit purge
+"""
+from collections import OrderedDict
+from typing import Tuple
+import argparse
+import math
+import os
+import threading
+import time
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import case, delete, literal
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.database import RateLimitBucket, create_tables, engine
+from app.metrics import Counter
+from app.stats import UPSERT_INSERTS
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Sustained requests per minute and burst size, per client IP and per username
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_USERNAME_PER_MINUTE = float(os.getenv("RATE_LIMIT_USERNAME_PER_MINUTE", "10"))
+RATE_LIMIT_USERNAME_BURST = float(os.getenv("RATE_LIMIT_USERNAME_BURST", "5"))
+# Memory backend: lock shards and the most keys kept across all shards
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# limit name -> (tokens per second, burst)
+LIMITS = {
+    "login_ip": (RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST),
+    "login_username": (RATE_LIMIT_USERNAME_PER_MINUTE / 60, RATE_LIMIT_USERNAME_BURST),
+    "register_ip": (RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST),
+}
+
+RATE_LIMIT_REQUESTS = Counter(
+    "rate_limit_requests_total",
+    "Rate-limited endpoint checks by limit and result (allowed or limited).",
+    ("limit", "result"),
+)
+
+
+class MemoryBackend:
+    """Per-process buckets, sharded so concurrent checks rarely share a lock."""
+
+    blocking = False
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    def acquire(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; return 0 when allowed, else seconds until one is available."""
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, updated = buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            # Re-inserted last, so the first key is always the least recently used
+            buckets[key] = (tokens, now)
+            if len(buckets) > self._max_keys_per_shard:
+                buckets.popitem(last=False)
+        return wait
+
+    def reset(self) -> None:
+        for lock, buckets in self._shards:
+            with lock:
+                buckets.clear()
+
+
+class DatabaseBackend:
+    """Buckets in the rate_limit_buckets table, shared by all workers."""
+
+    blocking = True
+
+    def __init__(self, bind: Engine = engine):
+        self.engine = bind
+
+    def acquire(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()
+        bucket = RateLimitBucket.__table__.c
+        refilled = bucket.tokens + (literal(now) - bucket.updated_at) * rate
+        available = case((refilled > burst, literal(burst)), else_=refilled)
+        statement = (
+            UPSERT_INSERTS[self.engine.dialect.name](RateLimitBucket)
+            .values(key=key, tokens=burst - 1, updated_at=now, allowed=True)
+        )
+        # Refill and take a token in one statement: no read-modify-write race between workers
+        statement = statement.on_conflict_do_update(
+            index_elements=[bucket.key],
+            set_={
+                "tokens": case((available >= 1, available - 1), else_=available),
+                "updated_at": now,
+                "allowed": available >= 1,
+            },
+        ).returning(bucket.tokens, bucket.allowed)
+        with self.engine.begin() as connection:
+            tokens, allowed = connection.execute(statement).one()
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def reset(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(RateLimitBucket))
+
+    def purge_idle(self) -> int:
+        """Delete buckets that have refilled completely; they hold no state."""
+        longest_refill = max(burst / rate for rate, burst in LIMITS.values())
+        with self.engine.begin() as connection:
+            return connection.execute(
+                delete(RateLimitBucket).where(RateLimitBucket.updated_at < time.time() - longest_refill)
+            ).rowcount
+
+
+BACKENDS = {"memory": MemoryBackend, "database": DatabaseBackend}
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def check(self, limit: str, key: str) -> float:
+        """Count one request against a limit; return the seconds to wait (0 if allowed)."""
+        rate, burst = LIMITS[limit]
+        bucket_key = f"{limit}:{key}"
+        if self.backend.blocking:
+            wait = await run_in_threadpool(self.backend.acquire, bucket_key, rate, burst)
+        else:
+            wait = self.backend.acquire(bucket_key, rate, burst)
+        RATE_LIMIT_REQUESTS.labels(limit, "limited" if wait else "allowed").inc()
+        return wait
+
+    async def enforce(self, *checks: Tuple[str, str]) -> None:
+        """Raise 429 with Retry-After at the first (limit, key) that is exhausted."""
+        if not RATE_LIMIT_ENABLED:
+            return
+        for limit, key in checks:
+            wait = await self.check(limit, key)
+            if wait:
+                retry_after = max(1, math.ceil(wait))
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"Too many attempts, retry in {retry_after} seconds",
+                    headers={"Retry-After": str(retry_after)},
+                )
+
+
+rate_limiter = RateLimiter(BACKENDS[RATE_LIMIT_BACKEND]())
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    """Route dependency for POST /token (the form is parsed once and shared with the route)."""
+    await rate_limiter.enforce(
+        ("login_ip", client_ip(request)),
+        ("login_username", form_data.username.strip().lower()),
+    )
+
+
+async def limit_register(request: Request):
+    """Route dependency for POST /register."""
+    await rate_limiter.enforce(("register_ip", client_ip(request)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the rate_limit_buckets table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("purge", help="Delete buckets that have refilled completely")
+    parser.parse_args()
+
+    create_tables()
+    print(f"Purged {DatabaseBackend().purge_idle()} idle rate limit buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""JSON encoding for responses, using orjson when it is installed.
+
+Browse and read build their bodies here straight from selected columns:
+the rows come from the database already typed, so validating them again
+through CalculationResponse (and the stdlib encoder) only costs time.
+RESPONSE_COLUMNS must stay in step with the CalculationResponse fields.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+import json
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from app.database import Calculation
+
+try:
+    import orjson
+except ImportError:  # optional dependency: fall back to the stdlib encoder
+    orjson = None
+
+DefaultResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+RESPONSE_COLUMNS = (
+    Calculation.id,
+    Calculation.operation,
+    Calculation.operand1,
+    Calculation.operand2,
+    Calculation.expression,
+    Calculation.variables,
+    Calculation.result,
+    Calculation.user_id,
+    Calculation.created_at,
+    Calculation.updated_at,
+)
+RESPONSE_FIELDS = tuple(column.key for column in RESPONSE_COLUMNS)
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content) -> bytes:
+    """Encode to compact UTF-8 JSON (datetimes as ISO 8601)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def row_to_dict(row) -> dict:
+    return dict(zip(RESPONSE_FIELDS, row))
+
+
+def rows_response(rows: Iterable, headers: Optional[dict] = None) -> Response:
+    """Serialize RESPONSE_COLUMNS rows as a JSON array."""
+    return Response(
+        content=dump_json([dict(zip(RESPONSE_FIELDS, row)) for row in rows]),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def row_response(row, headers: Optional[dict] = None) -> Response:
+    """Serialize one RESPONSE_COLUMNS row as a JSON object."""
+    return Response(content=dump_json(row_to_dict(row)), media_type="application/json", headers=headers)
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, ValidationInfo, field_validator, model_validator
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from app.expressions import compile_expression
+
+ALLOWED_OPERATIONS = ['add', 'subtract', 'multiply', 'divide', 'expression']
+
 
 # User Schemas
 class UserBase(BaseModel):
@@ -14,31 +18,63 @@ class UserCreate(UserBase):
 
 
 class UserResponse(UserBase):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     created_at: datetime
+
+
+class AuthenticatedUser(BaseModel):
+    """Lightweight identity of the caller, cached per access token."""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
     
-    class Config:
-        from_attributes = True
+    id: int
+    username: str
+    email: str
+    created_at: datetime
 
 
 # Calculation Schemas
 class CalculationBase(BaseModel):
-    operation: str = Field(..., description="Operation: add, subtract, multiply, divide")
-    operand1: float = Field(..., description="First operand")
-    operand2: float = Field(..., description="Second operand")
+    operation: str = Field(..., description="Operation: add, subtract, multiply, divide, expression")
+    operand1: Optional[float] = Field(None, description="First operand (arithmetic operations)")
+    operand2: Optional[float] = Field(None, description="Second operand (arithmetic operations)")
+    expression: Optional[str] = Field(None, description="Formula such as (a + b) * c / 2 (expression operation)")
+    variables: Optional[Dict[str, float]] = Field(None, description="Values of the formula's variables")
     
-    @validator('operation')
-    def validate_operation(cls, v):
-        allowed_operations = ['add', 'subtract', 'multiply', 'divide']
-        if v.lower() not in allowed_operations:
-            raise ValueError(f'Operation must be one of: {", ".join(allowed_operations)}')
+    @field_validator('operation')
+    @classmethod
+    def validate_operation(cls, v: str) -> str:
+        if v.lower() not in ALLOWED_OPERATIONS:
+            raise ValueError(f'Operation must be one of: {", ".join(ALLOWED_OPERATIONS)}')
         return v.lower()
     
-    @validator('operand2')
-    def validate_division_by_zero(cls, v, values):
-        if 'operation' in values and values['operation'].lower() == 'divide' and v == 0:
+    @field_validator('operand2')
+    @classmethod
+    def validate_division_by_zero(cls, v: Optional[float], info: ValidationInfo) -> Optional[float]:
+        if info.data.get('operation') == 'divide' and v == 0:
             raise ValueError('Cannot divide by zero')
         return v
+    
+    @model_validator(mode='after')
+    def validate_operands(self):
+        if self.operation == 'expression':
+            if not self.expression:
+                raise ValueError('expression is required for the expression operation')
+            compiled = compile_expression(self.expression)
+            missing = compiled.variables.difference(self.variables or {})
+            if missing:
+                raise ValueError(f'Missing variables: {", ".join(sorted(missing))}')
+            unknown = set(self.variables or {}).difference(compiled.variables)
+            if unknown:
+                raise ValueError(f'Unknown variables: {", ".join(sorted(unknown))}')
+        else:
+            if self.operand1 is None or self.operand2 is None:
+                raise ValueError('operand1 and operand2 are required')
+            # Only the expression operation keeps a formula, as on edit
+            self.expression = None
+            self.variables = None
+        return self
 
 
 class CalculationCreate(CalculationBase):
@@ -49,32 +85,80 @@ class CalculationUpdate(BaseModel):
     operation: Optional[str] = None
     operand1: Optional[float] = None
     operand2: Optional[float] = None
+    expression: Optional[str] = None
+    variables: Optional[Dict[str, float]] = None
     
-    @validator('operation')
-    def validate_operation(cls, v):
+    @field_validator('operation')
+    @classmethod
+    def validate_operation(cls, v: Optional[str]) -> Optional[str]:
         if v is not None:
-            allowed_operations = ['add', 'subtract', 'multiply', 'divide']
-            if v.lower() not in allowed_operations:
-                raise ValueError(f'Operation must be one of: {", ".join(allowed_operations)}')
+            if v.lower() not in ALLOWED_OPERATIONS:
+                raise ValueError(f'Operation must be one of: {", ".join(ALLOWED_OPERATIONS)}')
             return v.lower()
         return v
 
 
 class CalculationResponse(CalculationBase):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     result: float
     user_id: int
     created_at: datetime
     updated_at: datetime
-    
-    class Config:
-        from_attributes = True
+
+
+class CalculationBatchError(BaseModel):
+    index: int = Field(..., description="Position of the rejected item in the request")
+    detail: str
+
+
+class CalculationBatchResponse(BaseModel):
+    created: List[CalculationResponse]
+    errors: List[CalculationBatchError]
+
+
+class CalculationImportError(BaseModel):
+    line: int = Field(..., description="1-based line number in the uploaded body")
+    detail: str
+
+
+class CalculationImportSummary(BaseModel):
+    imported: int
+    failed: int
+    errors: List[CalculationImportError]
+    errors_truncated: bool = Field(False, description="True when more errors occurred than are listed")
+
+
+class CalculationChangesResponse(BaseModel):
+    version: int = Field(..., description="Pass as `since` on the next sync")
+    calculations: List[CalculationResponse] = Field(..., description="Rows created or updated since `since`")
+    deleted: List[int] = Field(..., description="Ids of calculations deleted since `since`")
+    has_more: bool = Field(..., description="More changes follow; sync again from `version` right away")
+
+
+class OperationStats(BaseModel):
+    count: int
+    total: float
+    min_result: Optional[float] = None
+    max_result: Optional[float] = None
+    average: Optional[float] = None
+    last_activity: Optional[datetime] = None
+
+
+class CalculationStatsResponse(OperationStats):
+    operations: Dict[str, OperationStats]
 
 
 # Token Schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token from POST /token or a previous refresh")
 
 
 class TokenData(BaseModel):
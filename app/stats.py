@@ -0,0 +1,164 @@
+"""Incrementally maintained per-user calculation statistics.
+
+Every write path calls record_added / record_removed inside its own
+transaction, so GET /calculations/stats reads a handful of pre-aggregated
+rows instead of scanning the user's history. All helpers take a sync
+Session; async handlers call them through ``await db.run_sync(...)``.
+
+Float sums drift slightly as values are added and removed. Repair drift, or
+backfill the table after upgrading an existing database, with:
+
+    python -m app.stats rebuild [--user-id ID]
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+import argparse
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.database import Calculation, CalculationStat, SessionLocal, create_tables
+
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _least(dialect_name: str, *values):
+    """Two-argument minimum: LEAST on Postgres, scalar MIN on SQLite."""
+    return func.least(*values) if dialect_name == "postgresql" else func.min(*values)
+
+
+def _greatest(dialect_name: str, *values):
+    """Two-argument maximum: GREATEST on Postgres, scalar MAX on SQLite."""
+    return func.greatest(*values) if dialect_name == "postgresql" else func.max(*values)
+
+
+def record_added(session: Session, user_id: int, results: Iterable[Tuple[str, float]], when: datetime) -> None:
+    """Fold newly inserted (operation, result) pairs into the user's stats rows."""
+    aggregates = {}
+    for operation, result in results:
+        count, total, low, high = aggregates.get(operation, (0, 0.0, result, result))
+        aggregates[operation] = (count + 1, total + result, min(low, result), max(high, result))
+    if not aggregates:
+        return
+
+    dialect_name = session.get_bind().dialect.name
+    upsert = UPSERT_INSERTS[dialect_name]
+    # Sorted so concurrent writers lock stats rows in the same order
+    for operation in sorted(aggregates):
+        count, total, low, high = aggregates[operation]
+        statement = upsert(CalculationStat).values(
+            user_id=user_id,
+            operation=operation,
+            count=count,
+            total=total,
+            min_result=low,
+            max_result=high,
+            last_activity=when,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[CalculationStat.user_id, CalculationStat.operation],
+            set_={
+                "count": CalculationStat.count + statement.excluded.count,
+                "total": CalculationStat.total + statement.excluded.total,
+                "min_result": _least(
+                    dialect_name,
+                    func.coalesce(CalculationStat.min_result, statement.excluded.min_result),
+                    statement.excluded.min_result,
+                ),
+                "max_result": _greatest(
+                    dialect_name,
+                    func.coalesce(CalculationStat.max_result, statement.excluded.max_result),
+                    statement.excluded.max_result,
+                ),
+                "last_activity": statement.excluded.last_activity,
+            },
+        )
+        session.execute(statement)
+
+
+def record_removed(session: Session, user_id: int, operation: str, result: float, when: datetime) -> None:
+    """Take a deleted (or replaced) row out of the user's stats.
+
+    The row itself must already be flushed away: when it held the current
+    minimum or maximum, the new extreme is re-read from the
+    (user_id, operation, result) index.
+    """
+    key = (CalculationStat.user_id == user_id) & (CalculationStat.operation == operation)
+    remaining = session.execute(
+        update(CalculationStat)
+        .where(key)
+        .values(
+            count=CalculationStat.count - 1,
+            total=CalculationStat.total - result,
+            last_activity=when,
+        )
+        .returning(CalculationStat.count, CalculationStat.min_result, CalculationStat.max_result)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if remaining is None:
+        return
+
+    count, low, high = remaining
+    if count <= 0:
+        values = {"count": 0, "total": 0.0, "min_result": None, "max_result": None}
+    elif low is None or high is None or result <= low or result >= high:
+        low, high = session.execute(
+            select(func.min(Calculation.result), func.max(Calculation.result)).where(
+                Calculation.user_id == user_id,
+                Calculation.operation == operation,
+            )
+        ).one()
+        values = {"min_result": low, "max_result": high}
+    else:
+        return
+    session.execute(
+        update(CalculationStat).where(key).values(**values).execution_options(synchronize_session=False)
+    )
+
+
+def rebuild_stats(session: Session, user_id: Optional[int] = None) -> int:
+    """Recompute stats rows from the calculations table; returns rows written."""
+    clear = delete(CalculationStat)
+    source = select(
+        Calculation.user_id,
+        Calculation.operation,
+        func.count(),
+        func.sum(Calculation.result),
+        func.min(Calculation.result),
+        func.max(Calculation.result),
+        func.max(Calculation.updated_at),
+    ).group_by(Calculation.user_id, Calculation.operation)
+    if user_id is not None:
+        clear = clear.where(CalculationStat.user_id == user_id)
+        source = source.where(Calculation.user_id == user_id)
+
+    session.execute(clear)
+    result = session.execute(
+        insert(CalculationStat).from_select(
+            ["user_id", "operation", "count", "total", "min_result", "max_result", "last_activity"],
+            source,
+        )
+    )
+    return result.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the calculation_stats summary table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="Recompute stats from the calculations table")
+    rebuild.add_argument("--user-id", type=int, help="Only rebuild this user's stats")
+    args = parser.parse_args()
+
+    create_tables()
+    with SessionLocal() as session:
+        rows = rebuild_stats(session, args.user_id)
+        session.commit()
+    print(f"Rebuilt {rows} stats rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Refresh tokens: rotation, reuse detection and a cheap revocation check.
+
+POST /token also returns a refresh token: a JWT of type "refresh" with a
+random "jti" and the "fam"ily id of the login, recorded in the
+refresh_tokens table. POST /token/refresh trades it for a new access and
+refresh token without any password hashing. Each refresh token works
+once. Presenting an already rotated token means it was copied, so its
+whole family is revoked and the client must log in again.
+
+Revoked jtis and families are also kept in in-process TTL caches until
+the tokens would have expired anyway, so replays are rejected without a
+database round trip. The table stays authoritative: rotation only
+succeeds on a row that is still live, so a worker whose cache missed a
+revocation still refuses the token. Expired rows are removed with:
+
+    python -m app.tokens purge
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import os
+import secrets
+import time
+
+from jose import JWTError, jwt
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.auth import ALGORITHM, SECRET_KEY
+from app.cache import TTLCache
+from app.database import RefreshToken, SessionLocal, create_tables
+from app.metrics import Counter
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Revoked jtis (and families) remembered in memory; the database is consulted on a miss
+REVOKED_TOKEN_CACHE_SIZE = int(os.getenv("REVOKED_TOKEN_CACHE_SIZE", "100000"))
+
+REFRESH_TOKEN_TYPE = "refresh"
+
+revoked_tokens = TTLCache(maxsize=REVOKED_TOKEN_CACHE_SIZE, ttl=REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+revoked_families = TTLCache(maxsize=REVOKED_TOKEN_CACHE_SIZE, ttl=REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+
+TOKEN_REFRESHES = Counter(
+    "token_refresh_total",
+    "POST /token/refresh outcomes (rotated, invalid, revoked, reused).",
+    ("result",),
+)
+
+
+def issue_refresh_token(session: Session, user_id: int, username: str, family: Optional[str] = None) -> str:
+    """Record a new refresh token (a new family unless one is given) and return it."""
+    jti = secrets.token_hex(16)
+    family = family or secrets.token_hex(16)
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    session.add(RefreshToken(jti=jti, family=family, user_id=user_id, expires_at=expires_at))
+    claims = {"sub": username, "uid": user_id, "type": REFRESH_TOKEN_TYPE, "jti": jti, "fam": family,
+              "exp": expires_at}
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_refresh_token(token: str) -> Optional[dict]:
+    """Return the claims of a well-formed, unexpired refresh token, else None."""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("type") != REFRESH_TOKEN_TYPE or not all(claims.get(key) for key in ("sub", "uid", "jti", "fam")):
+        return None
+    return claims
+
+
+def _remember(cache: TTLCache, key: str, expires_at: float) -> None:
+    """Cache a revocation until the POSIX time the token(s) expire anyway."""
+    cache.set(key, True, ttl=expires_at - time.time())
+
+
+def revoke_family(session: Session, family: str, expires_at: float) -> int:
+    """Revoke every live token of a family (logout, or a detected replay)."""
+    revoked = session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    _remember(revoked_families, family, expires_at)
+    return revoked
+
+
+def rotate_refresh_token(session: Session, claims: dict) -> Optional[str]:
+    """Revoke the presented token and issue its successor in the same family.
+
+    Returns None when the token was already used or revoked; a replayed
+    token revokes its family as well. Call inside a transaction and commit
+    either way.
+    """
+    jti, family, expires_at = claims["jti"], claims["fam"], claims["exp"]
+    if revoked_families.get(family) is not None:
+        TOKEN_REFRESHES.labels("revoked").inc()
+        return None
+    rotated = 0
+    if revoked_tokens.get(jti) is None:
+        # Only one request can flip a live row, so concurrent replays cannot both win
+        rotated = session.execute(
+            update(RefreshToken)
+            .where(RefreshToken.jti == jti, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        _remember(revoked_tokens, jti, expires_at)
+    if not rotated:
+        TOKEN_REFRESHES.labels("reused").inc()
+        revoke_family(session, family, expires_at)
+        return None
+    TOKEN_REFRESHES.labels("rotated").inc()
+    return issue_refresh_token(session, claims["uid"], claims["sub"], family=family)
+
+
+def load_revoked(session: Session) -> int:
+    """Warm the revocation cache with revoked, still unexpired tokens (at startup)."""
+    rows = session.execute(
+        select(RefreshToken.jti, RefreshToken.expires_at)
+        .where(RefreshToken.revoked_at.is_not(None), RefreshToken.expires_at > datetime.utcnow())
+        .order_by(RefreshToken.revoked_at.desc())
+        .limit(REVOKED_TOKEN_CACHE_SIZE)
+    ).all()
+    for jti, expires_at in rows:
+        _remember(revoked_tokens, jti, _timestamp(expires_at))
+    return len(rows)
+
+
+def _timestamp(value: datetime) -> float:
+    """POSIX time of a naive UTC datetime (as stored by the table)."""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def purge_expired(session: Session) -> int:
+    """Delete refresh tokens past their expiry; they can no longer be presented."""
+    return session.execute(
+        delete(RefreshToken).where(RefreshToken.expires_at <= datetime.utcnow())
+    ).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the refresh_tokens table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("purge", help="Delete expired refresh tokens")
+    parser.parse_args()
+
+    create_tables()
+    with SessionLocal() as session:
+        rows = purge_expired(session)
+        session.commit()
+    print(f"Purged {rows} expired refresh tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Write-behind group commit for POST /calculations (WRITE_BEHIND_ENABLED=true).
+
+Each request computes its result, puts the row on an in-process asyncio
+queue and awaits it. A single background task takes up to
+WRITE_BEHIND_MAX_ROWS queued rows, waiting at most WRITE_BEHIND_MAX_DELAY_MS
+after the first one. It inserts them with one INSERT ... RETURNING, bumps
+the version and stats of every user involved, and commits once. One
+fsync then covers the whole group.
+
+Durability is unchanged: a request is answered (with its id) only after
+the commit holding its row succeeded, so an acknowledged calculation is
+never lost. A crash loses only rows whose requests had not been answered
+yet. The price is up to WRITE_BEHIND_MAX_DELAY_MS of extra latency when
+traffic is light. If a group fails, its rows are retried one transaction
+each, so a single bad row only fails its own request. On shutdown the
+queue is drained before the process exits.
+
+Requests carrying an Idempotency-Key bypass the queue, because their key
+row must commit in the same transaction as the calculation.
+"""
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import os
+
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from app.changefeed import record_calculations
+from app.database import Calculation
+from app.etags import bump_calculations_version
+from app.metrics import Histogram
+from app.schemas import CalculationResponse
+from app.stats import record_added
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "100"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "5"))
+# Requests wait (backpressure) once this many rows are queued
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+
+WRITE_BEHIND_GROUP_ROWS = Histogram(
+    "write_behind_group_rows",
+    "Rows committed per write-behind group commit.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+_STOP = object()
+
+
+def commit_group(session_factory, rows: List[dict]) -> List[CalculationResponse]:
+    """Insert rows of any users in one transaction; return them in order."""
+    now = datetime.utcnow()
+    rows = [
+        {**row, "created_at": row.get("created_at", now), "updated_at": row.get("created_at", now)}
+        for row in rows
+    ]
+    with session_factory() as session:
+        user_ids = sorted({row["user_id"] for row in rows})
+        # Lock users in id order, so concurrent groups cannot deadlock
+        versions = {user_id: bump_calculations_version(session, user_id) for user_id in user_ids}
+        rows = [{**row, "version": versions[row["user_id"]]} for row in rows]
+        for user_id in user_ids:
+            user_rows = [row for row in rows if row["user_id"] == user_id]
+            record_added(
+                session, user_id, [(row["operation"], row["result"]) for row in user_rows],
+                max(row["created_at"] for row in user_rows),
+            )
+        created = session.scalars(
+            insert(Calculation).returning(Calculation, sort_by_parameter_order=True), rows
+        ).all()
+        responses = [CalculationResponse.model_validate(calculation) for calculation in created]
+        for user_id in user_ids:
+            record_calculations(
+                session, user_id, "created", [response for response in responses if response.user_id == user_id]
+            )
+        session.commit()
+    return responses
+
+
+class WriteBehindQueue:
+    """Queue plus the background task that group-commits it.
+
+    The task is started by the first submit in the running event loop and
+    stopped by ``drain``.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        max_rows: int = WRITE_BEHIND_MAX_ROWS,
+        max_delay_ms: float = WRITE_BEHIND_MAX_DELAY_MS,
+        queue_size: int = WRITE_BEHIND_QUEUE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, row: dict) -> CalculationResponse:
+        """Queue one calculations row and wait until it is committed."""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+        # Timestamped when accepted, not when its group happens to commit
+        row = {**row, "created_at": datetime.utcnow()}
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def drain(self) -> None:
+        """Commit everything queued so far, then stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._queue = None
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is _STOP:
+                break
+            group = [entry]
+            deadline = loop.time() + self.max_delay
+            while len(group) < self.max_rows:
+                try:
+                    entry = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                group.append(entry)
+            await self._flush(group)
+
+    async def _flush(self, group: list) -> None:
+        rows = [row for row, _ in group]
+        try:
+            responses = await run_in_threadpool(commit_group, self.session_factory, rows)
+        except Exception as group_error:
+            print(f"Write-behind group of {len(rows)} rows failed, retrying one by one: {group_error}")
+            for row, future in group:
+                try:
+                    response = (await run_in_threadpool(commit_group, self.session_factory, [row]))[0]
+                except Exception as e:
+                    _resolve(future, error=e)
+                else:
+                    _resolve(future, response)
+            return
+        WRITE_BEHIND_GROUP_ROWS.observe(len(rows))
+        for (_, future), response in zip(group, responses):
+            _resolve(future, response)
+
+
+def _resolve(future: asyncio.Future, result=None, error: Optional[Exception] = None) -> None:
+    # The request may have been cancelled (client gone); its row is committed regardless
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -0,0 +1,45 @@
+"""Micro-benchmark: CPU cost and size of compressing API responses.
+
+Compresses one browse page (--rows calculations, as the fast path encodes
+it) and one single read with each available encoding at the configured
+COMPRESSION_* levels, the way CompressionMiddleware does.
+
+    python -m benchmarks.bench_compression --rows 100
+"""
+import argparse
+import timeit
+
+from app import compression, responses
+from benchmarks.bench_serialization import make_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="Calculations per page")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    _, rows = make_page(args.rows)
+    bodies = {
+        f"browse ({args.rows} rows)": responses.rows_response(rows).body,
+        "single read": responses.row_response(rows[0]).body,
+    }
+
+    print(f"{'body':>20} {'encoding':>8} {'bytes':>8} {'ratio':>6} {'us':>8}")
+    for label, body in bodies.items():
+        print(f"{label:>20} {'identity':>8} {len(body):>8} {1:>6.2f} {0:>8.1f}")
+        if len(body) < compression.COMPRESSION_MIN_SIZE:
+            print(f"{'':>20} below COMPRESSION_MIN_SIZE={compression.COMPRESSION_MIN_SIZE}: sent uncompressed")
+            continue
+        for encoding, compressor_class in compression.COMPRESSORS.items():
+            def run():
+                compressor = compressor_class()
+                return compressor.compress(body) + compressor.finish()
+            size = len(run())
+            seconds = min(timeit.repeat(run, number=args.number, repeat=args.repeat)) / args.number
+            print(f"{'':>20} {encoding:>8} {size:>8} {len(body) / size:>6.2f} {seconds * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
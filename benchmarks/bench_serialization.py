@@ -0,0 +1,73 @@
+"""Micro-benchmark: cost of serializing one browse page.
+
+Compares, per page of --rows calculations:
+  before    FastAPI's response_model path (validate ORM objects as
+            List[CalculationResponse], then the stdlib JSONResponse)
+  orjson    the same validation, rendered by ORJSONResponse
+  fast      selected rows encoded directly by app.responses (what browse
+            and read do now)
+
+    python -m benchmarks.bench_serialization --rows 100
+"""
+from datetime import datetime, timedelta
+from typing import List
+import argparse
+import asyncio
+import timeit
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app import responses
+from app.database import Calculation
+from app.schemas import CalculationResponse
+
+
+def make_page(size: int):
+    now = datetime(2024, 1, 1)
+    objects = []
+    for i in range(size):
+        objects.append(Calculation(
+            id=i + 1, operation="multiply", operand1=float(i), operand2=2.5, expression=None,
+            variables=None, result=i * 2.5, user_id=1,
+            created_at=now + timedelta(seconds=i), updated_at=now + timedelta(seconds=i, microseconds=7),
+        ))
+    rows = [tuple(getattr(obj, column.key) for column in responses.RESPONSE_COLUMNS) for obj in objects]
+    return objects, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="Calculations per page")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    objects, rows = make_page(args.rows)
+    field = create_response_field(name="Response_browse", type_=List[CalculationResponse])
+    loop = asyncio.new_event_loop()
+
+    def response_model_path(response_class):
+        def run():
+            content = loop.run_until_complete(serialize_response(field=field, response_content=objects))
+            return response_class(content=content).body
+        return run
+
+    cases = {"before (response_model + json)": response_model_path(JSONResponse)}
+    if responses.orjson is not None:
+        cases["response_model + orjson"] = response_model_path(ORJSONResponse)
+    cases["fast path"] = lambda: responses.rows_response(rows).body
+
+    print(f"{'path':>32} {'us/page':>10} {'speedup':>8}")
+    baseline = None
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number
+        baseline = baseline or seconds
+        print(f"{name:>32} {seconds * 1e6:>10.1f} {baseline / seconds:>7.1f}x")
+    if responses.orjson is None:
+        print("orjson is not installed; the fast path uses the stdlib encoder")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Load test for the hot API endpoints with baseline comparison.
+
+Starts the app with uvicorn against a local database (SQLite by default),
+then runs --concurrency virtual users. Each one registers, logs in and
+repeats add / browse / read / edit / delete for --iterations rounds.
+Throughput and p50/p95/p99 latency per endpoint are printed as JSON.
+
+    python -m benchmarks.loadtest --concurrency 20 --iterations 50 --output run.json
+    python -m benchmarks.loadtest --baseline run.json --tolerance 10
+
+With --baseline the run is compared endpoint by endpoint; the exit status is
+1 when p95 latency grew, or throughput dropped, by more than --tolerance
+percent. Use --url to target an already running server instead.
+Without --database-url the server gets a throwaway SQLite file that is
+deleted afterwards; a database given with --database-url is left as is.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ENDPOINTS = ("register", "token", "add", "browse", "read", "edit", "delete")
+
+
+class Recorder:
+    """Latency samples (seconds) and error counts per endpoint."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+
+    async def call(self, name: str, request, expected: int) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.samples[name].append(time.perf_counter() - started)
+        if response.status_code != expected:
+            self.errors[name] += 1
+            return None
+        return response
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, iterations: int) -> None:
+    """Register, log in and cycle through the calculation endpoints."""
+    name = f"load_{uuid.uuid4().hex[:12]}"
+    password = "loadtest-password"
+    await recorder.call("register", client.post(
+        "/register", json={"username": name, "email": f"{name}@example.com", "password": password}
+    ), 201)
+    token = await recorder.call("token", client.post(
+        "/token", data={"username": name, "password": password}
+    ), 200)
+    if token is None:
+        return
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+    for i in range(iterations):
+        created = await recorder.call("add", client.post(
+            "/calculations", json={"operation": "multiply", "operand1": i, "operand2": 3}, headers=headers
+        ), 201)
+        await recorder.call("browse", client.get("/calculations?limit=20", headers=headers), 200)
+        if created is None:
+            continue
+        calculation_id = created.json()["id"]
+        await recorder.call("read", client.get(f"/calculations/{calculation_id}", headers=headers), 200)
+        await recorder.call("edit", client.put(
+            f"/calculations/{calculation_id}", json={"operation": "add"}, headers=headers
+        ), 200)
+        # Keep every other row so browse pages are not empty
+        if i % 2:
+            await recorder.call("delete", client.delete(f"/calculations/{calculation_id}", headers=headers), 204)
+
+
+def summarize(recorder: Recorder, elapsed: float, args) -> dict:
+    endpoints = {}
+    for name in ENDPOINTS:
+        values = sorted(recorder.samples[name])
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": recorder.errors[name],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+    total = sum(len(values) for values in recorder.samples.values())
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "database_url": args.database_url if not args.url else None,
+            "url": args.url,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a description of every endpoint that regressed beyond tolerance percent."""
+    regressions = []
+    limit = 1 + tolerance / 100
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous["requests"] or not current["requests"]:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * limit:
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_rps"] * limit < previous["throughput_rps"]:
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def start_server(args) -> subprocess.Popen:
+    # Every virtual user registers and logs in from 127.0.0.1
+    env = dict(os.environ, DATABASE_URL=args.database_url, RATE_LIMIT_ENABLED="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready in time")
+
+
+async def run(args, server: Optional[subprocess.Popen]) -> dict:
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_ready(client, server, args.startup_timeout)
+        recorder = Recorder()
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(client, recorder, args.iterations) for _ in range(args.concurrency)))
+        return summarize(recorder, time.perf_counter() - started, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=20, help="Add/browse/read/edit/delete rounds per user")
+    parser.add_argument("--database-url",
+                        help="Database for the spawned server (default: a throwaway SQLite file)")
+    parser.add_argument("--url", help="Target an already running server instead of spawning one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file (e.g. to store a baseline)")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    # Only a database this run created is deleted afterwards
+    scratch_dir = None
+    if not args.url and args.database_url is None:
+        scratch_dir = tempfile.mkdtemp(prefix="loadtest-")
+        args.database_url = f"sqlite:///{os.path.join(scratch_dir, 'loadtest.db')}"
+
+    server = None if args.url else start_server(args)
+    try:
+        report = asyncio.run(run(args, server))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance_pct": args.tolerance, "regressions": regressions}
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
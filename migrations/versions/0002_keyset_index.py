@@ -0,0 +1,29 @@
+"""Composite index for keyset pagination of GET /calculations
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+Skipped when a newer build's create_all already made it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_calculations_user_id_id" not in {index["name"] for index in inspector.get_indexes("calculations")}:
+        op.create_index("ix_calculations_user_id_id", "calculations", ["user_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_calculations_user_id_id", table_name="calculations")
@@ -0,0 +1,47 @@
+"""Per-user statistics table and its min/max index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+Skipped when a newer build's create_all already made it.
+
+calculation_stats starts empty; fill it with `python -m app.stats rebuild`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_calculations_user_id_operation_result" not in {
+        index["name"] for index in inspector.get_indexes("calculations")
+    }:
+        op.create_index(
+            "ix_calculations_user_id_operation_result", "calculations", ["user_id", "operation", "result"]
+        )
+    if not inspector.has_table("calculation_stats"):
+        op.create_table(
+            "calculation_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("operation", sa.String(), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("total", sa.Float(), nullable=False),
+            sa.Column("min_result", sa.Float(), nullable=True),
+            sa.Column("max_result", sa.Float(), nullable=True),
+            sa.Column("last_activity", sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("calculation_stats")
+    op.drop_index("ix_calculations_user_id_operation_result", table_name="calculations")
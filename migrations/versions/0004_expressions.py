@@ -0,0 +1,40 @@
+"""Expression calculations: optional operands, expression and variables
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+Skipped when a newer build's create_all already made it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"]: column for column in sa.inspect(op.get_bind()).get_columns("calculations")}
+    with op.batch_alter_table("calculations") as batch:
+        for name in ("operand1", "operand2"):
+            if not columns[name]["nullable"]:
+                batch.alter_column(name, existing_type=sa.Float(), nullable=True)
+        if "expression" not in columns:
+            batch.add_column(sa.Column("expression", sa.String(), nullable=True))
+        if "variables" not in columns:
+            batch.add_column(sa.Column("variables", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    # Fails while expression calculations (no operands) exist; remove them first
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_column("variables")
+        batch.drop_column("expression")
+        batch.alter_column("operand1", existing_type=sa.Float(), nullable=False)
+        batch.alter_column("operand2", existing_type=sa.Float(), nullable=False)
@@ -0,0 +1,32 @@
+"""Per-user calculations version behind the list ETag
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+Skipped when a newer build's create_all already made it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if "calculations_version" not in {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")
+    }:
+        with op.batch_alter_table("users") as batch:
+            batch.add_column(sa.Column("calculations_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("calculations_version")
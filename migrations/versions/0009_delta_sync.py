@@ -0,0 +1,58 @@
+"""Delta sync: calculation versions, purge horizon and tombstones
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+
+Skipped when a newer build's create_all already made it.
+
+Existing calculations keep version 0, so GET /calculations/changes returns
+them only in a full sync.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "calculations_purged_version" not in {column["name"] for column in inspector.get_columns("users")}:
+        with op.batch_alter_table("users") as batch:
+            batch.add_column(
+                sa.Column("calculations_purged_version", sa.Integer(), nullable=False, server_default="0")
+            )
+    if "version" not in {column["name"] for column in inspector.get_columns("calculations")}:
+        with op.batch_alter_table("calculations") as batch:
+            batch.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+    inspector = sa.inspect(op.get_bind())
+    if "ix_calculations_user_id_version" not in {index["name"] for index in inspector.get_indexes("calculations")}:
+        op.create_index("ix_calculations_user_id_version", "calculations", ["user_id", "version"])
+    if not inspector.has_table("calculation_tombstones"):
+        op.create_table(
+            "calculation_tombstones",
+            sa.Column("calculation_id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_calculation_tombstones_deleted_at", "calculation_tombstones", ["deleted_at"])
+        op.create_index(
+            "ix_calculation_tombstones_user_id_version", "calculation_tombstones", ["user_id", "version"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("calculation_tombstones")
+    op.drop_index("ix_calculations_user_id_version", table_name="calculations")
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_column("version")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("calculations_purged_version")
@@ -0,0 +1,52 @@
+"""Never reuse calculation ids on SQLite
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+
+SQLite hands the id of the newest deleted row to the next insert unless
+the table is AUTOINCREMENT. A reused id collides with its tombstone and
+shows up as both changed and deleted in GET /calculations/changes. The
+table is rebuilt as AUTOINCREMENT, with its sequence started above every
+id already used by a row or a tombstone. PostgreSQL sequences never
+reuse ids, so nothing changes there.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    table_sql = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE name = 'calculations'")).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        with op.batch_alter_table(
+            "calculations", recreate="always", table_kwargs={"sqlite_autoincrement": True}
+        ) as batch:
+            pass
+    last_id = bind.execute(sa.text(
+        "SELECT max(id) FROM (SELECT max(id) AS id FROM calculations"
+        " UNION ALL SELECT max(calculation_id) FROM calculation_tombstones)"
+    )).scalar() or 0
+    bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'calculations'"))
+    bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('calculations', :seq)"), {"seq": last_id})
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    with op.batch_alter_table(
+        "calculations", recreate="always", table_kwargs={"sqlite_autoincrement": False}
+    ) as batch:
+        pass
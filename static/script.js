@@ -3,8 +3,21 @@ const API_URL = '';
 
 // Token storage
 let accessToken = localStorage.getItem('accessToken');
+let refreshToken = localStorage.getItem('refreshToken');
 let currentUser = null;
 
+// Last response body and ETag of each GET endpoint, revalidated with If-None-Match
+const etagCache = new Map();
+
+// Calculations on screen: the first page of GET /calculations (ordered by id),
+// kept current with deltas instead of reloading the list after every change
+const PAGE_SIZE = 100;
+let calculations = [];
+
+// Open GET /calculations/stream request, aborted on logout
+let changeStream = null;
+const STREAM_RETRY_MS = 3000;
+
 // DOM Elements
 const authSection = document.getElementById('auth-section');
 const appSection = document.getElementById('app-section');
@@ -37,8 +50,48 @@ function showToast(message, type = 'info') {
     }, 3000);
 }
 
+function storeTokens(data) {
+    accessToken = data.access_token;
+    refreshToken = data.refresh_token;
+    localStorage.setItem('accessToken', accessToken);
+    localStorage.setItem('refreshToken', refreshToken);
+}
+
+function clearTokens() {
+    accessToken = null;
+    refreshToken = null;
+    localStorage.removeItem('accessToken');
+    localStorage.removeItem('refreshToken');
+}
+
+// Trade the refresh token for a new pair instead of asking for the password again.
+// Concurrent callers share one request: each refresh token works only once.
+let refreshInFlight = null;
+function refreshAccessToken() {
+    if (!refreshToken) {
+        return Promise.resolve(false);
+    }
+    if (!refreshInFlight) {
+        refreshInFlight = fetch(`${API_URL}/token/refresh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).then(async (response) => {
+            if (!response.ok) {
+                clearTokens();
+                return false;
+            }
+            storeTokens(await response.json());
+            return true;
+        }).catch(() => false).finally(() => {
+            refreshInFlight = null;
+        });
+    }
+    return refreshInFlight;
+}
+
 // API Request Helper
-async function apiRequest(endpoint, options = {}) {
+async function apiRequest(endpoint, options = {}, retried = false) {
     const headers = {
         'Content-Type': 'application/json',
         ...options.headers
@@ -48,12 +101,28 @@ async function apiRequest(endpoint, options = {}) {
         headers['Authorization'] = `Bearer ${accessToken}`;
     }
 
+    const isGet = !options.method || options.method === 'GET';
+    const cached = isGet ? etagCache.get(endpoint) : undefined;
+    if (cached) {
+        headers['If-None-Match'] = cached.etag;
+    }
+
     try {
         const response = await fetch(`${API_URL}${endpoint}`, {
             ...options,
             headers
         });
 
+        // Access token expired: refresh it once and repeat the request
+        if (response.status === 401 && accessToken && !retried && await refreshAccessToken()) {
+            return apiRequest(endpoint, options, true);
+        }
+
+        // Unchanged since the last fetch: reuse the cached body
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.detail || 'Request failed');
@@ -64,7 +133,12 @@ async function apiRequest(endpoint, options = {}) {
             return null;
         }
 
-        return await response.json();
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (isGet && etag) {
+            etagCache.set(endpoint, { etag, data });
+        }
+        return data;
     } catch (error) {
         console.error('API Error:', error);
         throw error;
@@ -119,9 +193,8 @@ loginForm.addEventListener('submit', async (e) => {
             throw new Error(error.detail || 'Login failed');
         }
 
-        const data = await response.json();
-        accessToken = data.access_token;
-        localStorage.setItem('accessToken', accessToken);
+        storeTokens(await response.json());
+        etagCache.clear();
 
         // Get current user
         await loadCurrentUser();
@@ -133,8 +206,9 @@ loginForm.addEventListener('submit', async (e) => {
         showToast('Login successful!', 'success');
         loginForm.reset();
         
-        // Load calculations
+        // Load calculations and follow changes made in other tabs
         await loadCalculations();
+        openChangeStream();
     } catch (error) {
         showToast(error.message, 'error');
     }
@@ -152,9 +226,18 @@ async function loadCurrentUser() {
 
 // Logout Handler
 document.getElementById('logout-btn').addEventListener('click', () => {
-    accessToken = null;
+    closeChangeStream();
+    if (refreshToken) {
+        fetch(`${API_URL}/token/revoke`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).catch(() => {});
+    }
+    clearTokens();
     currentUser = null;
-    localStorage.removeItem('accessToken');
+    etagCache.clear();
+    calculations = [];
     
     appSection.style.display = 'none';
     authSection.style.display = 'block';
@@ -165,6 +248,22 @@ document.getElementById('logout-btn').addEventListener('click', () => {
     showToast('Logged out successfully', 'info');
 });
 
+// Escape text before it is placed in innerHTML
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = String(text);
+    return div.innerHTML;
+}
+
+// Format an expression calculation with its variable values
+function formatExpression(calc) {
+    const values = Object.entries(calc.variables || {})
+        .map(([name, value]) => `${escapeHtml(name)}=${escapeHtml(value)}`)
+        .join(', ');
+    const expression = escapeHtml(calc.expression);
+    return values ? `${expression} (${values})` : expression;
+}
+
 // Format operation symbol
 function getOperationSymbol(operation) {
     const symbols = {
@@ -187,35 +286,136 @@ async function loadCalculations() {
     try {
         calculationsList.innerHTML = '<p class="loading">Loading calculations...</p>';
         
-        const calculations = await apiRequest('/calculations');
-        
-        if (calculations.length === 0) {
-            calculationsList.innerHTML = '<p class="empty-state">No calculations yet. Add your first calculation above!</p>';
-            return;
-        }
+        // Copied: the ETag cache keeps the response body itself
+        calculations = [...await apiRequest('/calculations')];
+        renderCalculations();
+    } catch (error) {
+        calculationsList.innerHTML = `<p class="error">Failed to load calculations: ${error.message}</p>`;
+    }
+}
+
+function renderCalculations() {
+    if (calculations.length === 0) {
+        calculationsList.innerHTML = '<p class="empty-state">No calculations yet. Add your first calculation above!</p>';
+        return;
+    }
 
-        calculationsList.innerHTML = calculations.map(calc => `
-            <div class="calculation-item" data-id="${calc.id}">
-                <div class="calculation-info">
-                    <div class="calculation-expression">
-                        ${calc.operand1} ${getOperationSymbol(calc.operation)} ${calc.operand2}
-                    </div>
-                    <div class="calculation-result">
-                        = ${calc.result}
-                    </div>
-                    <div class="calculation-meta">
-                        Created: ${formatDate(calc.created_at)}
-                        ${calc.updated_at !== calc.created_at ? `| Updated: ${formatDate(calc.updated_at)}` : ''}
-                    </div>
+    calculationsList.innerHTML = calculations.map(calc => `
+        <div class="calculation-item" data-id="${calc.id}">
+            <div class="calculation-info">
+                <div class="calculation-expression">
+                    ${calc.operation === 'expression'
+                        ? formatExpression(calc)
+                        : `${calc.operand1} ${getOperationSymbol(calc.operation)} ${calc.operand2}`}
                 </div>
-                <div class="calculation-actions">
-                    <button class="btn btn-success" onclick="editCalculation(${calc.id})">Edit</button>
-                    <button class="btn btn-danger" onclick="deleteCalculation(${calc.id})">Delete</button>
+                <div class="calculation-result">
+                    = ${calc.result}
                 </div>
+                <div class="calculation-meta">
+                    Created: ${formatDate(calc.created_at)}
+                    ${calc.updated_at !== calc.created_at ? `| Updated: ${formatDate(calc.updated_at)}` : ''}
+                </div>
+            </div>
+            <div class="calculation-actions">
+                <button class="btn btn-success" onclick="editCalculation(${calc.id})">Edit</button>
+                <button class="btn btn-danger" onclick="deleteCalculation(${calc.id})">Delete</button>
             </div>
-        `).join('');
+        </div>
+    `).join('');
+}
+
+// Insert or replace rows; applying the same change twice (own write + stream) is harmless
+function upsertCalculations(rows) {
+    for (const row of rows) {
+        const index = calculations.findIndex(calc => calc.id === row.id);
+        if (index >= 0) {
+            calculations[index] = row;
+        } else if (calculations.length < PAGE_SIZE) {
+            // Only a list without further pages can grow; ids increase, so new rows go last
+            calculations.push(row);
+            calculations.sort((a, b) => a.id - b.id);
+        }
+    }
+    renderCalculations();
+}
+
+function removeCalculations(ids) {
+    calculations = calculations.filter(calc => !ids.includes(calc.id));
+    renderCalculations();
+}
+
+function applyChange(change) {
+    if (change.type === 'created' || change.type === 'updated') {
+        upsertCalculations(change.calculations);
+    } else if (change.type === 'deleted') {
+        removeCalculations(change.ids);
+    } else {
+        loadCalculations();
+    }
+}
+
+// Follow GET /calculations/stream. It is read with fetch because EventSource
+// cannot send the Authorization header. When the stream ends (it closes when
+// the access token would expire) or drops, reconnect and reload the list,
+// since changes made in between are not replayed.
+async function openChangeStream(reload = false) {
+    closeChangeStream();
+    const controller = new AbortController();
+    changeStream = controller;
+    try {
+        let response = null;
+        for (let attempt = 0; attempt < 2; attempt++) {
+            response = await fetch(`${API_URL}/calculations/stream`, {
+                headers: { 'Authorization': `Bearer ${accessToken}` },
+                signal: controller.signal
+            });
+            if (response.status !== 401 || !(await refreshAccessToken())) {
+                break;
+            }
+        }
+        if (!response.ok) {
+            throw new Error(`Change stream refused (${response.status})`);
+        }
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += value;
+            const blocks = buffer.split('\n\n');
+            buffer = blocks.pop();
+            for (const block of blocks) {
+                if (block.startsWith('data: ')) {
+                    applyChange(JSON.parse(block.slice('data: '.length)));
+                } else if (block === ': subscribed' && reload) {
+                    loadCalculations();
+                }
+            }
+        }
     } catch (error) {
-        calculationsList.innerHTML = `<p class="error">Failed to load calculations: ${error.message}</p>`;
+        if (controller.signal.aborted) {
+            return;
+        }
+        console.error('Change stream error:', error);
+    }
+
+    if (changeStream === controller) {
+        changeStream = null;
+        setTimeout(() => {
+            if (accessToken && !changeStream) {
+                openChangeStream(true);
+            }
+        }, STREAM_RETRY_MS);
+    }
+}
+
+function closeChangeStream() {
+    if (changeStream) {
+        changeStream.abort();
+        changeStream = null;
     }
 }
 
@@ -244,28 +444,28 @@ calculationForm.addEventListener('submit', async (e) => {
     try {
         if (calculationId) {
             // Update existing calculation
-            await apiRequest(`/calculations/${calculationId}`, {
+            const updated = await apiRequest(`/calculations/${calculationId}`, {
                 method: 'PUT',
                 body: JSON.stringify(data)
             });
+            upsertCalculations([updated]);
             showToast('Calculation updated successfully!', 'success');
         } else {
             // Add new calculation
-            await apiRequest('/calculations', {
+            const created = await apiRequest('/calculations', {
                 method: 'POST',
                 body: JSON.stringify(data)
             });
+            upsertCalculations([created]);
             showToast('Calculation added successfully!', 'success');
         }
 
-        // Reset form and reload calculations
+        // Reset form
         calculationForm.reset();
         document.getElementById('calculation-id').value = '';
         document.getElementById('form-title').textContent = 'Add New Calculation';
         document.getElementById('submit-btn').textContent = 'Add Calculation';
         document.getElementById('cancel-btn').style.display = 'none';
-        
-        await loadCalculations();
     } catch (error) {
         showToast(error.message, 'error');
     }
@@ -315,8 +515,8 @@ async function deleteCalculation(id) {
             method: 'DELETE'
         });
         
+        removeCalculations([id]);
         showToast('Calculation deleted successfully!', 'success');
-        await loadCalculations();
     } catch (error) {
         showToast(error.message, 'error');
     }
@@ -331,9 +531,9 @@ if (accessToken) {
         authSection.style.display = 'none';
         appSection.style.display = 'block';
         loadCalculations();
+        openChangeStream();
     }).catch(() => {
         // Token invalid, clear it
-        accessToken = null;
-        localStorage.removeItem('accessToken');
+        clearTokens();
     });
 }
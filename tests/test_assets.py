@@ -0,0 +1,116 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import assets
+from app.assets import PrecompressedStaticFiles, build
+
+
+@pytest.fixture
+def built(tmp_path):
+    """A small source tree built into tmp_path/dist."""
+    source = tmp_path / "static"
+    source.mkdir()
+    (source / "index.html").write_text(
+        '<link rel="stylesheet" href="/static/style.css"><script src="/static/script.js"></script>'
+    )
+    (source / "script.js").write_text("console.log('calculations');\n" * 200)
+    (source / "style.css").write_text("body { margin: 0; }\n" * 200)
+    manifest = build(str(source), str(tmp_path / "dist"))
+    return tmp_path / "dist", manifest
+
+
+@pytest.fixture
+def static_client(built):
+    build_dir, manifest = built
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=str(build_dir), immutable=set(manifest.values())))
+    with TestClient(app) as client:
+        yield client, manifest
+
+
+class TestAssetBuild:
+    """Unit tests for python -m app.assets build."""
+
+    def test_fingerprints_rewrites_and_compresses(self, built):
+        """Test hashed names, manifest, index.html references and variants."""
+        build_dir, manifest = built
+
+        assert manifest["script.js"].startswith("script.") and manifest["script.js"].endswith(".js")
+        assert json.loads((build_dir / "manifest.json").read_text()) == manifest
+        index = (build_dir / "index.html").read_text()
+        assert f'/static/{manifest["style.css"]}' in index
+        assert f'/static/{manifest["script.js"]}' in index
+        compressed = (build_dir / f'{manifest["script.js"]}.gz').read_bytes()
+        assert gzip.decompress(compressed) == (build_dir / manifest["script.js"]).read_bytes()
+        if assets.brotli is not None:
+            assert (build_dir / f'{manifest["script.js"]}.br').exists()
+
+    def test_fingerprint_changes_with_content(self, tmp_path):
+        """Test that editing an asset gives it a new name."""
+        source = tmp_path / "static"
+        source.mkdir()
+        (source / "app.js").write_text("one")
+        first = build(str(source), str(tmp_path / "dist"))["app.js"]
+        (source / "app.js").write_text("two")
+
+        assert build(str(source), str(tmp_path / "dist"))["app.js"] != first
+
+
+class TestPrecompressedStaticFiles:
+    """Tests for Accept-Encoding negotiation and caching headers."""
+
+    @pytest.mark.parametrize("accept, expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip;q=0.5", "gzip"),
+        ("identity", None),
+    ])
+    def test_serves_best_accepted_variant(self, static_client, accept, expected):
+        """Test the stored variant matching Accept-Encoding is chosen."""
+        client, manifest = static_client
+        if expected == "br" and assets.brotli is None:
+            pytest.skip("brotli is not installed")
+
+        response = client.get(f'/static/{manifest["script.js"]}', headers={"Accept-Encoding": accept})
+
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding") == expected
+        assert "javascript" in response.headers["content-type"]
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.text.startswith("console.log")
+
+    def test_fingerprinted_assets_are_immutable_and_index_revalidates(self, static_client):
+        """Test Cache-Control of hashed assets vs. index.html, and 304 on revalidation."""
+        client, manifest = static_client
+
+        asset = client.get(f'/static/{manifest["style.css"]}')
+        index = client.get("/static/index.html", headers={"Accept-Encoding": "gzip"})
+        revalidated = client.get(
+            "/static/index.html", headers={"Accept-Encoding": "gzip", "If-None-Match": index.headers["etag"]}
+        )
+
+        assert asset.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert index.headers["cache-control"] == "no-cache"
+        assert revalidated.status_code == 304
+
+    def test_missing_asset_is_404(self, static_client):
+        """Test that unknown files are not found (negative)."""
+        client, _ = static_client
+
+        assert client.get("/static/missing.js", headers={"Accept-Encoding": "gzip"}).status_code == 404
+
+
+class TestMainPage:
+    """API test for GET /."""
+
+    def test_index_is_revalidated(self, client):
+        """Test the main page is served as HTML that must be revalidated."""
+        response = client.get("/")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert response.headers["cache-control"] == "no-cache"
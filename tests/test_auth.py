@@ -0,0 +1,122 @@
+import pytest
+
+from app.auth import auth_cache, invalidate_user
+
+
+class TestAuthenticatedUserCache:
+    """API tests for the authenticated-user cache in get_current_user."""
+
+    def test_repeat_requests_hit_cache(self, client, auth_headers):
+        """Test that the second request with a token is served from cache."""
+        first = client.get("/users/me", headers=auth_headers)
+        second = client.get("/users/me", headers=auth_headers)
+
+        assert first.status_code == second.status_code == 200
+        assert first.json() == second.json()
+        assert auth_cache.stats()["hits"] >= 1
+
+    def test_invalidate_user(self, client, auth_headers):
+        """Test explicit invalidation drops the user's cached identity."""
+        user_id = client.get("/users/me", headers=auth_headers).json()["id"]
+
+        assert invalidate_user(user_id) == 1
+        assert len(auth_cache) == 0
+
+    def test_invalid_token_is_not_cached(self, client):
+        """Test that a rejected token leaves nothing in the cache (negative)."""
+        response = client.get("/users/me", headers={"Authorization": "Bearer bogus"})
+
+        assert response.status_code == 401
+        assert len(auth_cache) == 0
+
+    def test_health_reports_cache_stats(self, client):
+        """Test that /health/auth exposes the cache counters."""
+        response = client.get("/health/auth")
+
+        assert response.status_code == 200
+        assert "hits" in response.json()["user_cache"]
+
+
+class TestPasswordHashingPool:
+    """Tests for bcrypt running on the dedicated hashing pool."""
+
+    async def test_async_hash_and_verify(self):
+        """Test hashing and verification round-trip through the pool."""
+        from app.auth import get_password_hash_async, hash_pool_stats, verify_password_async
+
+        hashed = await get_password_hash_async("secret123")
+
+        assert await verify_password_async("secret123", hashed)
+        assert not await verify_password_async("wrong", hashed)
+        stats = hash_pool_stats()
+        assert stats["completed"] >= 3
+        assert stats["queued"] == 0
+
+    def test_login_reports_pool_usage(self, client, auth_token):
+        """Test that /health/auth exposes the hashing pool counters."""
+        stats = client.get("/health/auth").json()["password_hashing"]
+
+        assert stats["completed"] >= 2
+        assert stats["workers"] >= 1
+
+
+class TestPasswordRehash:
+    """Tests for hash scheme/cost configuration and rehash on login."""
+
+    def test_context_flags_other_costs_and_schemes(self, monkeypatch):
+        """Test hashes at another bcrypt cost or of a deprecated scheme need an update."""
+        from app import auth
+
+        monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+        bcrypt_context = auth.build_crypt_context(["bcrypt"])
+        old_hash = bcrypt_context.hash("secret123")
+        monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 6)
+
+        assert auth.build_crypt_context(["bcrypt"]).needs_update(old_hash)
+        assert not bcrypt_context.needs_update(old_hash)
+        if auth.argon2 is None:
+            return
+        argon2_context = auth.build_crypt_context(["argon2", "bcrypt"])
+        assert argon2_context.needs_update(old_hash)
+        assert argon2_context.verify("secret123", old_hash)
+        assert argon2_context.hash("secret123").startswith("$argon2id$")
+
+    def test_argon2_requires_its_backend(self, monkeypatch):
+        """Test configuring argon2 without argon2-cffi fails loudly (negative)."""
+        from app import auth
+
+        monkeypatch.setattr(auth, "argon2", None)
+        with pytest.raises(RuntimeError):
+            auth.build_crypt_context(["argon2", "bcrypt"])
+
+    def test_login_upgrades_outdated_hash(self, client, test_user, db, monkeypatch):
+        """Test a successful login stores a hash at the configured cost, once."""
+        from app import auth
+        from app.database import User
+
+        monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+        monkeypatch.setattr(auth, "pwd_context", auth.build_crypt_context(["bcrypt"]))
+        credentials = {"username": test_user["username"], "password": test_user["password"]}
+
+        assert client.post("/token", data=credentials).status_code == 200
+        db.expire_all()
+        upgraded = db.query(User).filter_by(username=test_user["username"]).one().hashed_password
+        assert upgraded.startswith("$2b$05$")
+
+        assert client.post("/token", data=credentials).status_code == 200
+        db.expire_all()
+        assert db.query(User).filter_by(username=test_user["username"]).one().hashed_password == upgraded
+
+    def test_failed_login_keeps_hash(self, client, test_user, db, monkeypatch):
+        """Test a wrong password never rewrites the stored hash (negative)."""
+        from app import auth
+        from app.database import User
+
+        original = db.query(User).filter_by(username=test_user["username"]).one().hashed_password
+        monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+        monkeypatch.setattr(auth, "pwd_context", auth.build_crypt_context(["bcrypt"]))
+
+        response = client.post("/token", data={"username": test_user["username"], "password": "wrong"})
+        assert response.status_code == 401
+        db.expire_all()
+        assert db.query(User).filter_by(username=test_user["username"]).one().hashed_password == original
@@ -0,0 +1,48 @@
+import time
+
+from app.cache import TTLCache
+
+
+class TestTTLCache:
+    """Unit tests for the shared TTL+LRU cache."""
+
+    def test_get_and_counters(self):
+        """Test hits and misses are counted."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the LRU entry is evicted when full."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_entries_expire(self):
+        """Test that per-entry TTL is honoured and capped by the cache TTL."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("short", 1, ttl=0.01)
+        cache.set("never", 2, ttl=0)
+        time.sleep(0.02)
+
+        assert cache.get("short") is None
+        assert cache.get("never") is None
+
+    def test_discard_where(self):
+        """Test predicate-based invalidation."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        assert cache.discard_where(lambda value: value == 1) == 1
+        assert len(cache) == 1
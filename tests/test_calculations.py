@@ -0,0 +1,327 @@
+import csv
+import io
+import json
+
+
+class TestBatchCalculations:
+    """API tests for POST /calculations/batch."""
+
+    def test_batch_creates_all_valid_items(self, client, auth_headers):
+        """Test that a fully valid batch is inserted in order."""
+        items = [
+            {"operation": "add", "operand1": 1, "operand2": 2},
+            {"operation": "multiply", "operand1": 3, "operand2": 4},
+            {"operation": "divide", "operand1": 10, "operand2": 4},
+        ]
+        response = client.post("/calculations/batch", json=items, headers=auth_headers)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["errors"] == []
+        assert [c["result"] for c in body["created"]] == [3, 12, 2.5]
+        assert all(c["id"] for c in body["created"])
+
+        listing = client.get("/calculations", headers=auth_headers).json()
+        assert len(listing) == 3
+
+    def test_batch_reports_item_errors_without_aborting(self, client, auth_headers):
+        """Test that invalid items are reported by index (negative)."""
+        items = [
+            {"operation": "add", "operand1": 1, "operand2": 2},
+            {"operation": "divide", "operand1": 1, "operand2": 0},
+            {"operation": "power", "operand1": 2, "operand2": 3},
+            {"operation": "subtract", "operand1": 5},
+            {"operation": "subtract", "operand1": 5, "operand2": 1},
+        ]
+        response = client.post("/calculations/batch", json=items, headers=auth_headers)
+
+        assert response.status_code == 200
+        body = response.json()
+        assert [c["result"] for c in body["created"]] == [3, 4]
+        assert [e["index"] for e in body["errors"]] == [1, 2, 3]
+        assert "divide by zero" in body["errors"][0]["detail"]
+
+    def test_batch_rejects_oversized_request(self, client, auth_headers, monkeypatch):
+        """Test that batches above BATCH_MAX_SIZE are refused (negative)."""
+        monkeypatch.setattr("app.main.BATCH_MAX_SIZE", 2)
+        items = [{"operation": "add", "operand1": 1, "operand2": 1}] * 3
+        response = client.post("/calculations/batch", json=items, headers=auth_headers)
+
+        assert response.status_code == 413
+
+    def test_batch_requires_authentication(self, client):
+        """Test that the batch endpoint is protected (negative)."""
+        response = client.post("/calculations/batch", json=[])
+
+        assert response.status_code == 401
+
+
+class TestBrowsePagination:
+    """API tests for offset and keyset pagination on GET /calculations."""
+
+    def _create(self, client, auth_headers, count):
+        items = [{"operation": "add", "operand1": i, "operand2": 0} for i in range(count)]
+        response = client.post("/calculations/batch", json=items, headers=auth_headers)
+        return [c["id"] for c in response.json()["created"]]
+
+    def test_cursor_walks_all_pages_in_order(self, client, auth_headers):
+        """Test that following X-Next-Cursor returns every row exactly once."""
+        ids = self._create(client, auth_headers, 7)
+
+        seen = []
+        response = client.get("/calculations?limit=3", headers=auth_headers)
+        while True:
+            seen.extend(c["id"] for c in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            response = client.get(f"/calculations?limit=3&after={cursor}", headers=auth_headers)
+
+        assert seen == sorted(ids)
+
+    def test_offset_pages_are_ordered(self, client, auth_headers):
+        """Test that offset pagination is ordered by id."""
+        ids = self._create(client, auth_headers, 5)
+
+        response = client.get("/calculations?skip=2&limit=2", headers=auth_headers)
+
+        assert [c["id"] for c in response.json()] == sorted(ids)[2:4]
+
+    def test_invalid_cursor_is_rejected(self, client, auth_headers):
+        """Test that a malformed cursor returns 400 (negative)."""
+        response = client.get("/calculations?after=not-a-cursor", headers=auth_headers)
+
+        assert response.status_code == 400
+
+
+class TestDatabaseHealth:
+    """API tests for GET /health/db."""
+
+    def test_reports_pool_statistics(self, client):
+        """Test that pool occupancy and wait counters are reported."""
+        response = client.get("/health/db")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "healthy"
+        assert "checkout_wait_ms_avg" in body["pools"]["sync"]
+        assert "checked_out" in body["pools"]["sync"]
+
+
+class TestExportCalculations:
+    """API tests for GET /calculations/export."""
+
+    def _create(self, client, auth_headers, count):
+        items = [{"operation": "multiply", "operand1": i, "operand2": 2} for i in range(count)]
+        client.post("/calculations/batch", json=items, headers=auth_headers)
+
+    def test_export_ndjson(self, client, auth_headers, monkeypatch):
+        """Test NDJSON export streams every row across several chunks."""
+        monkeypatch.setattr("app.main.EXPORT_CHUNK_SIZE", 2)
+        self._create(client, auth_headers, 5)
+
+        response = client.get("/calculations/export?format=ndjson", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["result"] for row in rows] == [0, 2, 4, 6, 8]
+
+    def test_export_csv(self, client, auth_headers):
+        """Test CSV export has a header and one line per row."""
+        self._create(client, auth_headers, 3)
+
+        response = client.get("/calculations/export?format=csv", headers=auth_headers)
+
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 3
+        assert rows[1]["operation"] == "multiply"
+        assert float(rows[2]["result"]) == 4
+
+    def test_export_rejects_unknown_format(self, client, auth_headers):
+        """Test that unsupported formats are rejected (negative)."""
+        response = client.get("/calculations/export?format=xml", headers=auth_headers)
+
+        assert response.status_code == 422
+
+
+class TestImportCalculations:
+    """API tests for POST /calculations/import."""
+
+    def test_import_ndjson_in_chunks(self, client, auth_headers, monkeypatch):
+        """Test NDJSON rows are validated, computed and loaded chunk by chunk."""
+        monkeypatch.setattr("app.main.IMPORT_CHUNK_SIZE", 2)
+        body = "\n".join([
+            json.dumps({"operation": "add", "operand1": 1, "operand2": 2}),
+            json.dumps({"operation": "subtract", "operand1": 5, "operand2": 3}),
+            "",
+            json.dumps({"operation": "divide", "operand1": 9, "operand2": 3}),
+        ]) + "\n"
+
+        response = client.post(
+            "/calculations/import?format=ndjson", content=body, headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"imported": 3, "failed": 0, "errors": [], "errors_truncated": False}
+        listing = client.get("/calculations", headers=auth_headers).json()
+        assert [c["result"] for c in listing] == [3, 2, 3]
+
+    def test_import_csv_reports_row_errors(self, client, auth_headers):
+        """Test that invalid CSV rows are reported by line number (negative)."""
+        body = (
+            "operation,operand1,operand2\r\n"
+            "multiply,2,4\r\n"
+            "divide,1,0\r\n"
+            "modulo,1,2\r\n"
+            "add,1\r\n"
+            "add,0.5,0.25\r\n"
+        )
+
+        response = client.post("/calculations/import?format=csv", content=body, headers=auth_headers)
+
+        summary = response.json()
+        assert summary["imported"] == 2
+        assert summary["failed"] == 3
+        assert [e["line"] for e in summary["errors"]] == [3, 4, 5]
+
+    def test_import_reports_invalid_utf8(self, client, auth_headers):
+        """Test that a line that is not UTF-8 is a row error, not a server error (negative)."""
+        body = b'{"operation": "add", "operand1": 1, "operand2": 2}\n\xff\xfe\n'
+
+        response = client.post("/calculations/import", content=body, headers=auth_headers)
+
+        assert response.status_code == 200
+        summary = response.json()
+        assert summary["imported"] == 1
+        assert summary["failed"] == 1
+        assert summary["errors"][0]["line"] == 2
+        assert "utf-8" in summary["errors"][0]["detail"]
+
+    def test_import_error_list_is_bounded(self, client, auth_headers, monkeypatch):
+        """Test that only IMPORT_MAX_ERRORS errors are listed."""
+        monkeypatch.setattr("app.main.IMPORT_MAX_ERRORS", 1)
+        body = "not json\nalso not json\n"
+
+        summary = client.post("/calculations/import", content=body, headers=auth_headers).json()
+
+        assert summary["failed"] == 2
+        assert len(summary["errors"]) == 1
+        assert summary["errors_truncated"] is True
+
+
+class TestCalculationStats:
+    """API tests for GET /calculations/stats and the incremental summary table."""
+
+    def _stats(self, client, auth_headers):
+        response = client.get("/calculations/stats", headers=auth_headers)
+        assert response.status_code == 200
+        body = response.json()
+        body.pop("last_activity")
+        for operation in body["operations"].values():
+            operation.pop("last_activity")
+        return body
+
+    def test_empty_stats(self, client, auth_headers):
+        """Test stats for a user without calculations."""
+        assert self._stats(client, auth_headers) == {
+            "count": 0, "total": 0, "min_result": None, "max_result": None,
+            "average": None, "operations": {}
+        }
+
+    def test_stats_follow_every_write_path(self, client, auth_headers, db):
+        """Test add, batch, import, edit and delete keep stats equal to a full rebuild."""
+        from app.stats import rebuild_stats
+
+        first = client.post(
+            "/calculations", json={"operation": "add", "operand1": 1, "operand2": 1}, headers=auth_headers
+        ).json()
+        client.post("/calculations/batch", json=[
+            {"operation": "add", "operand1": 10, "operand2": 10},
+            {"operation": "multiply", "operand1": 3, "operand2": 3},
+        ], headers=auth_headers)
+        client.post(
+            "/calculations/import",
+            content=json.dumps({"operation": "multiply", "operand1": -2, "operand2": 4}) + "\n",
+            headers=auth_headers,
+        )
+        extreme = client.post(
+            "/calculations", json={"operation": "add", "operand1": 50, "operand2": 50}, headers=auth_headers
+        ).json()
+        client.put(f"/calculations/{first['id']}", json={"operation": "subtract"}, headers=auth_headers)
+        client.delete(f"/calculations/{extreme['id']}", headers=auth_headers)
+
+        incremental = self._stats(client, auth_headers)
+        assert incremental["count"] == 4
+        assert incremental["operations"]["add"] == {
+            "count": 1, "total": 20, "min_result": 20, "max_result": 20, "average": 20
+        }
+        assert incremental["operations"]["multiply"]["min_result"] == -8
+        assert incremental["operations"]["subtract"]["count"] == 1
+
+        rebuild_stats(db)
+        db.commit()
+        assert self._stats(client, auth_headers) == incremental
+
+
+class TestConditionalGet:
+    """API tests for ETag / If-None-Match on calculation reads."""
+
+    def _add(self, client, auth_headers, operand1=1):
+        return client.post(
+            "/calculations", json={"operation": "add", "operand1": operand1, "operand2": 2}, headers=auth_headers
+        ).json()
+
+    def test_browse_revalidates_until_a_write(self, client, auth_headers):
+        """Test the list ETag is stable across reads and changes on every write path."""
+        created = self._add(client, auth_headers)
+        first = client.get("/calculations", headers=auth_headers)
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        cached = client.get("/calculations", headers={**auth_headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        writes = [
+            lambda: self._add(client, auth_headers, 5),
+            lambda: client.post("/calculations/batch", json=[{"operation": "add", "operand1": 1, "operand2": 1}],
+                                headers=auth_headers),
+            lambda: client.post("/calculations/import", content='{"operation": "add", "operand1": 1, "operand2": 1}\n',
+                                headers=auth_headers),
+            lambda: client.put(f"/calculations/{created['id']}", json={"operand1": 9}, headers=auth_headers),
+            lambda: client.delete(f"/calculations/{created['id']}", headers=auth_headers),
+        ]
+        for write in writes:
+            write()
+            response = client.get("/calculations", headers={**auth_headers, "If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+            etag = response.headers["etag"]
+
+    def test_read_etag_follows_updated_at(self, client, auth_headers):
+        """Test a single calculation revalidates until it is edited."""
+        created = self._add(client, auth_headers)
+        url = f"/calculations/{created['id']}"
+        etag = client.get(url, headers=auth_headers).headers["etag"]
+
+        assert client.get(url, headers={**auth_headers, "If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+        client.put(url, json={"operand1": 10}, headers=auth_headers)
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["result"] == 12
+
+    def test_etags_are_per_user(self, client, auth_headers):
+        """Test another user's ETag or id never yields a 304 (negative)."""
+        created = self._add(client, auth_headers)
+        etag = client.get(f"/calculations/{created['id']}", headers=auth_headers).headers["etag"]
+        client.post("/register", json={"username": "other", "email": "other@example.com", "password": "secret123"})
+        token = client.post("/token", data={"username": "other", "password": "secret123"}).json()["access_token"]
+        other = {"Authorization": f"Bearer {token}"}
+
+        response = client.get(f"/calculations/{created['id']}", headers={**other, "If-None-Match": etag})
+
+        assert response.status_code == 404
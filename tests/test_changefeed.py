@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import changefeed
+from app.auth import auth_cache
+from app.changefeed import RESET, Subscription, change_feed, record_deleted
+from app.database import DATABASE_ASYNC, User
+from app.etags import bump_calculations_version
+from app.main import app
+from tests import conftest
+from tests.conftest import TestingSessionLocal, test_engine
+
+
+@pytest.fixture
+def feed(client):
+    """The app's change feed, listening on the test database (NOTIFY does not cross databases)."""
+    change_feed.stop()
+    change_feed.start(test_engine)
+    return change_feed
+
+
+def stream_scope(headers):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/calculations/stream", "raw_path": b"/calculations/stream",
+        "query_string": b"", "root_path": "", "client": ("testclient", 50000), "server": ("testserver", 80),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+
+
+def read_events(headers, count, actions):
+    """Open the stream, run ``actions`` (blocking TestClient calls) once subscribed, return ``count`` events.
+
+    The TestClient buffers whole responses, so the stream is driven as a raw ASGI call.
+    """
+    async def run():
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        request = asyncio.create_task(app(stream_scope(headers), receive, messages.put))
+        start = await asyncio.wait_for(messages.get(), 5)
+        assert start["status"] == 200
+        assert dict(start["headers"])[b"content-type"].startswith(b"text/event-stream")
+        buffer, events = b"", []
+        while len(events) < count:
+            buffer += (await asyncio.wait_for(messages.get(), 5)).get("body", b"")
+            *blocks, buffer = buffer.split(b"\n\n")
+            for block in blocks:
+                if block == b": subscribed":
+                    await asyncio.to_thread(actions)
+                elif block.startswith(b"data: "):
+                    events.append(json.loads(block[len(b"data: "):]))
+        disconnected.set()
+        await request
+        return events
+    return asyncio.run(run())
+
+
+class TestChangeStream:
+    """API tests for GET /calculations/stream."""
+
+    payload = {"operation": "add", "operand1": 1, "operand2": 2}
+
+    def test_bread_changes_are_pushed(self, feed, client, auth_headers):
+        """Test add, edit and delete each push their delta."""
+        created = {}
+
+        def actions():
+            created.update(client.post("/calculations", json=self.payload, headers=auth_headers).json())
+            client.put(f"/calculations/{created['id']}", json={"operand2": 5}, headers=auth_headers)
+            client.delete(f"/calculations/{created['id']}", headers=auth_headers)
+
+        events = read_events(auth_headers, 3, actions)
+
+        assert [event["type"] for event in events] == ["created", "updated", "deleted"]
+        assert events[0]["calculations"] == [created]
+        assert events[1]["calculations"][0]["result"] == 6
+        assert events[2]["ids"] == [created["id"]]
+        assert change_feed.subscriber_count() == 0
+
+    def test_bulk_writes(self, feed, client, auth_headers):
+        """Test a batch pushes its rows in one event and an import pushes a reset."""
+        def actions():
+            client.post("/calculations/batch", json=[self.payload, self.payload], headers=auth_headers)
+            client.post("/calculations/import", content=json.dumps(self.payload) + "\n", headers=auth_headers)
+
+        events = read_events(auth_headers, 2, actions)
+
+        assert events[0]["type"] == "created"
+        assert len(events[0]["calculations"]) == 2
+        assert events[1] == {"type": "reset"}
+
+    def test_other_users_changes_are_not_pushed(self, feed, client, auth_headers):
+        """Test a stream only carries its own user's changes (negative)."""
+        client.post("/register", json={"username": "other", "email": "other@example.com", "password": "password123"})
+        token = client.post("/token", data={"username": "other", "password": "password123"}).json()
+        other_headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+        def actions():
+            client.post("/calculations", json=self.payload, headers=other_headers)
+            client.post("/calculations", json={**self.payload, "operand1": 40}, headers=auth_headers)
+
+        events = read_events(auth_headers, 1, actions)
+
+        assert events[0]["calculations"][0]["result"] == 42
+
+    def test_stream_does_not_hold_a_connection(self, feed, client, auth_headers, db):
+        """Test an open stream has returned the connection it authenticated with."""
+        bind = conftest.test_async_engine.sync_engine if DATABASE_ASYNC else test_engine
+        checked_out = []
+        open_connections = []
+
+        def on_checkout(*args):
+            checked_out.append(1)
+
+        def on_checkin(*args):
+            checked_out.append(-1)
+
+        def actions():
+            open_connections.append(sum(checked_out))
+            client.post("/calculations", json=self.payload, headers=auth_headers)
+
+        db.rollback()
+        # Uncached, like the freshly refreshed token the frontend reconnects with
+        auth_cache.clear()
+        event.listen(bind, "checkout", on_checkout)
+        event.listen(bind, "checkin", on_checkin)
+        try:
+            read_events(auth_headers, 1, actions)
+        finally:
+            event.remove(bind, "checkout", on_checkout)
+            event.remove(bind, "checkin", on_checkin)
+
+        assert open_connections == [0]
+
+    def test_stream_requires_authentication(self, client):
+        """Test the stream is refused without a token (negative)."""
+        assert client.get("/calculations/stream").status_code == 401
+
+
+class TestChangeFeed:
+    """Unit tests for transactional publishing and slow subscribers."""
+
+    def test_rolled_back_changes_are_not_published(self, feed, test_user, db):
+        """Test only committed transactions publish their events (negative)."""
+        user_id = db.query(User).filter(User.username == test_user["username"]).one().id
+
+        async def run():
+            subscription = change_feed.subscribe(user_id)
+            try:
+                for calculation_id, commit in ((1, False), (2, True)):
+                    with TestingSessionLocal() as session:
+                        bump_calculations_version(session, user_id)
+                        record_deleted(session, user_id, [calculation_id])
+                        if commit:
+                            session.commit()
+                        else:
+                            session.rollback()
+                return await subscription.get(5), await subscription.get(0.2)
+            finally:
+                subscription.close()
+
+        first, second = asyncio.run(run())
+
+        assert json.loads(first) == {"type": "deleted", "ids": [2]}
+        assert second is None
+
+    def test_slow_subscriber_gets_a_reset(self, monkeypatch):
+        """Test a full queue is replaced by one reset event."""
+        monkeypatch.setattr(changefeed, "CHANGE_FEED_QUEUE_SIZE", 2)
+
+        async def run():
+            subscription = Subscription(change_feed, 1)
+            for n in range(3):
+                subscription.put(str(n).encode())
+            return [await subscription.get(0.1) for _ in range(2)]
+
+        assert asyncio.run(run()) == [RESET, None]
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+from app.changes import purge_tombstones
+from app.database import CalculationTombstone
+
+
+class TestCalculationChanges:
+    """API tests for GET /calculations/changes."""
+
+    payload = {"operation": "add", "operand1": 1, "operand2": 2}
+
+    def sync(self, client, headers, **params):
+        response = client.get("/calculations/changes", params=params, headers=headers)
+        assert response.status_code == 200
+        return response.json()
+
+    def test_full_sync(self, client, auth_headers):
+        """Test since=0 returns every calculation and no tombstones."""
+        created = client.post("/calculations/batch", json=[self.payload] * 2, headers=auth_headers).json()["created"]
+        client.delete(f"/calculations/{created[0]['id']}", headers=auth_headers)
+
+        changes = self.sync(client, auth_headers)
+
+        assert changes["calculations"] == created[1:]
+        assert changes["deleted"] == []
+        assert changes["has_more"] is False
+        assert changes["version"] > 0
+
+    def test_incremental_sync(self, client, auth_headers):
+        """Test only rows written and deleted after `since` are returned."""
+        ids = [
+            client.post("/calculations", json=self.payload, headers=auth_headers).json()["id"]
+            for _ in range(3)
+        ]
+        since = self.sync(client, auth_headers)["version"]
+
+        client.put(f"/calculations/{ids[0]}", json={"operand2": 5}, headers=auth_headers)
+        client.delete(f"/calculations/{ids[1]}", headers=auth_headers)
+        added = client.post("/calculations", json=self.payload, headers=auth_headers).json()
+        changes = self.sync(client, auth_headers, since=since)
+
+        assert [c["id"] for c in changes["calculations"]] == [ids[0], added["id"]]
+        assert changes["calculations"][0]["result"] == 6
+        assert changes["deleted"] == [ids[1]]
+        assert self.sync(client, auth_headers, since=changes["version"])["calculations"] == []
+
+    def test_pages_keep_writes_together(self, client, auth_headers):
+        """Test a page ends after a whole write, even past `limit`."""
+        client.post("/calculations", json=self.payload, headers=auth_headers)
+        client.post("/calculations/batch", json=[self.payload] * 3, headers=auth_headers)
+        client.post("/calculations", json=self.payload, headers=auth_headers)
+
+        first = self.sync(client, auth_headers, limit=2)
+        second = self.sync(client, auth_headers, since=first["version"], limit=2)
+
+        assert len(first["calculations"]) == 4
+        assert first["has_more"] is True
+        assert len(second["calculations"]) == 1
+        assert second["has_more"] is False
+
+    def test_deleted_ids_are_not_reused(self, client, auth_headers):
+        """Test deleting the newest row twice in a row never hands its id out again (negative)."""
+        client.post("/calculations", json=self.payload, headers=auth_headers)
+        since = self.sync(client, auth_headers)["version"]
+        ids = []
+        for _ in range(2):
+            ids.append(client.post("/calculations", json=self.payload, headers=auth_headers).json()["id"])
+            assert client.delete(f"/calculations/{ids[-1]}", headers=auth_headers).status_code == 204
+
+        changes = self.sync(client, auth_headers, since=since)
+
+        assert ids[0] != ids[1]
+        assert changes["calculations"] == []
+        assert changes["deleted"] == ids
+
+    def test_future_version_is_gone(self, client, auth_headers):
+        """Test a version the server never issued is refused (negative)."""
+        version = self.sync(client, auth_headers)["version"]
+
+        response = client.get("/calculations/changes", params={"since": version + 1}, headers=auth_headers)
+
+        assert response.status_code == 410
+
+    def test_purged_tombstones_are_gone(self, client, auth_headers, db):
+        """Test clients older than the purged tombstones must sync from 0 (negative)."""
+        first = client.post("/calculations", json=self.payload, headers=auth_headers).json()
+        since = self.sync(client, auth_headers)["version"]
+        client.delete(f"/calculations/{first['id']}", headers=auth_headers)
+        client.post("/calculations", json=self.payload, headers=auth_headers)
+        db.query(CalculationTombstone).update({"deleted_at": datetime.utcnow() - timedelta(days=365)})
+        db.commit()
+
+        assert purge_tombstones(db) == 1
+        db.commit()
+
+        response = client.get("/calculations/changes", params={"since": since}, headers=auth_headers)
+        assert response.status_code == 410
+        assert len(self.sync(client, auth_headers)["calculations"]) == 1
+
+    def test_other_users_changes_are_hidden(self, client, auth_headers):
+        """Test a sync only returns the user's own changes (negative)."""
+        client.post("/register", json={"username": "other", "email": "other@example.com", "password": "password123"})
+        token = client.post("/token", data={"username": "other", "password": "password123"}).json()
+        other_headers = {"Authorization": f"Bearer {token['access_token']}"}
+        other = client.post("/calculations", json=self.payload, headers=other_headers).json()
+        client.delete(f"/calculations/{other['id']}", headers=other_headers)
+
+        changes = self.sync(client, auth_headers)
+
+        assert changes == {"version": 0, "calculations": [], "deleted": [], "has_more": False}
+
+    def test_negative_since_is_rejected(self, client, auth_headers):
+        """Test `since` must not be negative (negative)."""
+        response = client.get("/calculations/changes", params={"since": -1}, headers=auth_headers)
+
+        assert response.status_code == 422
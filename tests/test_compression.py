@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app import compression
+from app.compression import CompressionMiddleware, accepted_encodings, accepts, choose_encoding
+
+
+def add_calculations(client, auth_headers, count):
+    response = client.post(
+        "/calculations/batch",
+        json=[{"operation": "add", "operand1": i, "operand2": i} for i in range(count)],
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+
+def run_app(app, headers):
+    """Call an ASGI app directly; returns the start message and body messages."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers}
+    asyncio.run(app(scope, receive, send))
+    return messages[0], messages[1:]
+
+
+def streaming_app(chunks, content_type=b"application/x-ndjson"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+class TestNegotiation:
+    """Unit tests for Accept-Encoding handling."""
+
+    def test_accept_encoding_parsing(self):
+        """Test q-values, wildcards and case are honoured."""
+        assert accepted_encodings("GZIP;q=1.0, br;q=0") == {"gzip"}
+        assert accepts(accepted_encodings("*"), "br")
+        assert accepted_encodings("") == set()
+
+    def test_server_preference_wins(self, monkeypatch):
+        """Test the first configured encoding the client accepts is chosen."""
+        monkeypatch.setattr(compression, "COMPRESSION_ENCODINGS", ["br", "gzip"])
+        expected = "br" if "br" in compression.COMPRESSORS else "gzip"
+
+        assert choose_encoding("gzip, br") == expected
+        assert choose_encoding("gzip") == "gzip"
+
+    def test_no_acceptable_encoding(self):
+        """Test identity-only clients get no encoding (negative)."""
+        assert choose_encoding("") is None
+        assert choose_encoding("identity, gzip;q=0") is None
+
+
+class TestCompressionMiddleware:
+    """Unit tests for buffering and streaming."""
+
+    def test_streamed_body_is_compressed_per_chunk(self):
+        """Test every chunk of a large stream is flushed and the stream decodes whole."""
+        chunks = [json.dumps({"id": i, "text": "x" * 600}).encode() + b"\n" for i in range(5)]
+        start, bodies = run_app(CompressionMiddleware(streaming_app(chunks)), [(b"accept-encoding", b"gzip")])
+
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert b"content-length" not in headers
+        assert len(bodies) == 4  # the first two chunks are buffered to reach the threshold
+        assert all(body["body"] for body in bodies)
+        assert gzip.decompress(b"".join(body["body"] for body in bodies)) == b"".join(chunks)
+
+    def test_small_stream_is_sent_uncompressed(self):
+        """Test a stream that ends below the threshold is passed through (negative)."""
+        chunks = [b'{"a": 1}\n', b'{"b": 2}\n']
+        start, bodies = run_app(CompressionMiddleware(streaming_app(chunks)), [(b"accept-encoding", b"gzip")])
+
+        assert b"content-encoding" not in dict(start["headers"])
+        assert b"".join(body["body"] for body in bodies) == b"".join(chunks)
+
+    def test_event_stream_is_not_compressed(self):
+        """Test text/event-stream responses are never buffered (negative)."""
+        chunks = [b"data: " + b"x" * 2000 + b"\n\n", b"data: end\n\n"]
+        app = CompressionMiddleware(streaming_app(chunks, content_type=b"text/event-stream"))
+        start, bodies = run_app(app, [(b"accept-encoding", b"gzip")])
+
+        assert b"content-encoding" not in dict(start["headers"])
+        assert [body["body"] for body in bodies] == chunks
+
+    @pytest.mark.parametrize("encoding", ["br", "zstd"])
+    def test_optional_encodings(self, encoding, monkeypatch):
+        """Test brotli and zstd bodies decode when their modules are installed."""
+        if encoding not in compression.COMPRESSORS:
+            pytest.skip(f"{encoding} support is not installed")
+        monkeypatch.setattr(compression, "COMPRESSION_ENCODINGS", [encoding])
+        chunks = [b"y" * 1500, b"z" * 1500]
+        start, bodies = run_app(CompressionMiddleware(streaming_app(chunks)), [(b"accept-encoding", encoding.encode())])
+
+        body = b"".join(message["body"] for message in bodies)
+        if encoding == "br":
+            decoded = compression.brotli.decompress(body)
+        else:
+            decoded = compression.zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        assert dict(start["headers"])[b"content-encoding"] == encoding.encode()
+        assert decoded == b"".join(chunks)
+
+
+class TestCompressedResponses:
+    """API tests for compressed API responses."""
+
+    def test_large_browse_is_compressed(self, client, auth_headers):
+        """Test a large list is gzip-encoded with a weak ETag that still revalidates."""
+        add_calculations(client, auth_headers, 50)
+
+        response = client.get("/calculations?limit=50", headers={**auth_headers, "Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert len(response.json()) == 50
+
+        etag = response.headers["etag"]
+        assert etag.startswith("W/")
+        revalidated = client.get(
+            "/calculations?limit=50", headers={**auth_headers, "Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert revalidated.status_code == 304
+
+    def test_streaming_export_is_compressed(self, client, auth_headers):
+        """Test the NDJSON export streams gzip-encoded."""
+        add_calculations(client, auth_headers, 50)
+
+        with client.stream(
+            "GET", "/calculations/export", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        ) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            raw = b"".join(response.iter_raw())
+
+        lines = zlib.decompress(raw, 31).splitlines()
+        assert len(lines) == 50
+
+    def test_small_responses_are_not_compressed(self, client, auth_headers):
+        """Test health checks and single reads skip compression (negative)."""
+        add_calculations(client, auth_headers, 1)
+        calculation_id = client.get("/calculations", headers=auth_headers).json()[0]["id"]
+
+        for path in ("/health", f"/calculations/{calculation_id}"):
+            response = client.get(path, headers={**auth_headers, "Accept-Encoding": "gzip"})
+            assert response.status_code == 200
+            assert "content-encoding" not in response.headers
+
+    def test_identity_clients_get_plain_bodies(self, client, auth_headers):
+        """Test clients that do not accept an encoding get the raw body (negative)."""
+        add_calculations(client, auth_headers, 50)
+
+        response = client.get("/calculations?limit=50", headers={**auth_headers, "Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert len(response.json()) == 50
@@ -0,0 +1,49 @@
+import asyncio
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+
+from app.database import (
+    InstrumentedAsyncQueuePool, apply_sqlite_pragmas, get_async_database_url, get_engine_options
+)
+
+PRAGMAS = ("journal_mode", "synchronous", "foreign_keys", "busy_timeout", "temp_store")
+
+
+class TestSQLiteMode:
+    """Unit tests for the SQLite engine configuration."""
+
+    def test_sync_connections_are_tuned(self, tmp_path):
+        """Test WAL and the other pragmas are applied on connect, with a real pool."""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        engine = create_engine(url, **get_engine_options(url, QueuePool))
+        apply_sqlite_pragmas(engine)
+
+        with engine.connect() as connection:
+            values = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in PRAGMAS}
+        engine.dispose()
+
+        assert isinstance(engine.pool, QueuePool)
+        # synchronous=NORMAL is 1, temp_store=MEMORY is 2
+        assert values == {
+            "journal_mode": "wal", "synchronous": 1, "foreign_keys": 1, "busy_timeout": 5000, "temp_store": 2
+        }
+
+    def test_async_connections_are_tuned(self, tmp_path):
+        """Test the aiosqlite engine gets the same pragmas and a queue pool."""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        engine = create_async_engine(
+            get_async_database_url(url), **get_engine_options(url, InstrumentedAsyncQueuePool)
+        )
+        apply_sqlite_pragmas(engine.sync_engine)
+
+        async def read_pragmas():
+            async with engine.connect() as connection:
+                journal_mode = (await connection.execute(text("PRAGMA journal_mode"))).scalar()
+                synchronous = (await connection.execute(text("PRAGMA synchronous"))).scalar()
+            await engine.dispose()
+            return journal_mode, synchronous
+
+        assert asyncio.run(read_pragmas()) == ("wal", 1)
+        assert isinstance(engine.pool, InstrumentedAsyncQueuePool)
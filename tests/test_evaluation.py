@@ -0,0 +1,73 @@
+import math
+import random
+
+import pytest
+
+from app import evaluation
+from app.evaluation import OPERATIONS, calculate_result, evaluate_batch
+
+
+def _random_batch(size, seed=218):
+    rng = random.Random(seed)
+    operations = [rng.choice(OPERATIONS) for _ in range(size)]
+    operand1 = [rng.uniform(-1e6, 1e6) for _ in range(size)]
+    operand2 = [rng.choice([0.0, -0.0, rng.uniform(-1e3, 1e3), 1e-300, 1e300]) for _ in range(size)]
+    return operations, operand1, operand2
+
+
+@pytest.fixture(params=["numpy", "scalar"])
+def engine(request, monkeypatch):
+    """Run each test against every evaluation path."""
+    if request.param == "numpy":
+        if evaluation.np is None:
+            pytest.skip("NumPy is not installed")
+        monkeypatch.setattr(evaluation, "VECTORIZE_MIN_SIZE", 0)
+    else:
+        monkeypatch.setattr(evaluation, "VECTORIZE_MIN_SIZE", 10 ** 9)
+    return request.param
+
+
+class TestEvaluateBatch:
+    """Unit tests for the columnar evaluation engine."""
+
+    def test_matches_scalar_bit_for_bit(self, engine):
+        """Test every result equals calculate_result exactly."""
+        operations, operand1, operand2 = _random_batch(2000)
+
+        results, zero_division = evaluate_batch(operations, operand1, operand2)
+
+        for i, operation in enumerate(operations):
+            if operation == "divide" and operand2[i] == 0:
+                assert zero_division[i]
+                assert math.isnan(results[i])
+            else:
+                assert not zero_division[i]
+                expected = calculate_result(operation, operand1[i], operand2[i])
+                assert float(results[i]).hex() == expected.hex()
+
+    def test_divide_by_zero_is_masked(self, engine):
+        """Test divide-by-zero is flagged instead of raised."""
+        results, zero_division = evaluate_batch(["divide", "add"], [1.0, 1.0], [0.0, 2.0])
+
+        assert list(map(bool, zero_division)) == [True, False]
+        assert results[1] == 3.0
+
+    def test_unknown_operation_raises(self, engine):
+        """Test that unsupported operations are rejected (negative)."""
+        with pytest.raises(ValueError):
+            evaluate_batch(["add", "power"], [1.0, 2.0], [1.0, 3.0])
+
+    def test_without_numpy_uses_scalar_path(self, monkeypatch):
+        """Test that large batches still evaluate when NumPy is missing."""
+        monkeypatch.setattr(evaluation, "np", None)
+        operations, operand1, operand2 = _random_batch(evaluation.VECTORIZE_MIN_SIZE + 1)
+
+        results, zero_division = evaluate_batch(operations, operand1, operand2)
+
+        assert len(results) == len(zero_division) == len(operations)
+
+    def test_empty_batch(self, engine):
+        """Test that an empty batch evaluates to nothing."""
+        results, zero_division = evaluate_batch([], [], [])
+
+        assert len(results) == len(zero_division) == 0
@@ -0,0 +1,168 @@
+import json
+
+import pytest
+
+from app.expressions import _compile, compile_expression, expression_cache_stats
+
+
+class TestCompileExpression:
+    """Unit tests for the compiled-expression cache."""
+
+    def test_evaluates_with_variables(self):
+        """Test a formula is evaluated with float arithmetic."""
+        compiled = compile_expression("(a + b) * c / 2")
+
+        assert compiled.variables == {"a", "b", "c"}
+        assert compiled.evaluate({"a": 1, "b": 2, "c": 3}) == 4.5
+        assert compile_expression("7 / 2").evaluate({}) == 3.5
+
+    def test_normalized_text_shares_cache_entry(self):
+        """Test that whitespace variants reuse one compiled evaluator."""
+        _compile.cache_clear()
+
+        first = compile_expression("a  +   b")
+        second = compile_expression(" a + b ")
+
+        assert first is second
+        assert expression_cache_stats()["hits"] == 1
+        assert expression_cache_stats()["misses"] == 1
+
+    @pytest.mark.parametrize("text", [
+        "__import__('os')",
+        "a ** 2",
+        "a.real",
+        "abs(a)",
+        "[a, b]",
+        "a if b else c",
+        "'text'",
+        "a +",
+        "",
+    ])
+    def test_rejects_unsafe_or_invalid_syntax(self, text):
+        """Test that anything beyond + - * / on numbers and names is refused (negative)."""
+        with pytest.raises(ValueError):
+            compile_expression(text)
+
+    def test_rejects_long_expressions(self, monkeypatch):
+        """Test the MAX_EXPRESSION_LENGTH limit (negative)."""
+        monkeypatch.setattr("app.expressions.MAX_EXPRESSION_LENGTH", 5)
+
+        with pytest.raises(ValueError):
+            compile_expression("a + b + c")
+
+    def test_rejects_oversized_literals(self, monkeypatch):
+        """Test integer literals beyond float range or the int conversion limit (negative)."""
+        monkeypatch.setattr("app.expressions.MAX_EXPRESSION_LENGTH", 10000)
+
+        with pytest.raises(ValueError, match="out of range"):
+            compile_expression("1" + "0" * 400)
+        with pytest.raises(ValueError):
+            compile_expression("1" + "0" * 5000)
+
+    def test_evaluation_errors(self):
+        """Test missing variables and division by zero (negative)."""
+        compiled = compile_expression("a / b")
+
+        with pytest.raises(ValueError, match="Missing variables: b"):
+            compiled.evaluate({"a": 1})
+        with pytest.raises(ValueError, match="divide by zero"):
+            compiled.evaluate({"a": 1, "b": 0})
+        with pytest.raises(ValueError, match="Unknown variables: c"):
+            compiled.evaluate({"a": 1, "b": 2, "c": 3})
+
+    def test_infinite_results_are_rejected(self):
+        """Test results that overflow to inf or nan are refused (negative)."""
+        with pytest.raises(ValueError, match="out of range"):
+            compile_expression("a * b").evaluate({"a": 1e308, "b": 10})
+        with pytest.raises(ValueError, match="out of range"):
+            compile_expression("a * b - a * b").evaluate({"a": 1e308, "b": 10})
+
+
+class TestExpressionCalculations:
+    """API tests for the expression operation."""
+
+    def test_create_and_edit_expression(self, client, auth_headers):
+        """Test an expression calculation is stored and recomputed on edit."""
+        payload = {"operation": "expression", "expression": "(a + b) * c / 2", "variables": {"a": 1, "b": 2, "c": 3}}
+        response = client.post("/calculations", json=payload, headers=auth_headers)
+
+        assert response.status_code == 201
+        created = response.json()
+        assert created["result"] == 4.5
+        assert created["expression"] == "(a + b) * c / 2"
+        assert created["operand1"] is None
+
+        updated = client.put(
+            f"/calculations/{created['id']}",
+            json={"variables": {"a": 3, "b": 3, "c": 2}},
+            headers=auth_headers,
+        ).json()
+        assert updated["result"] == 6
+
+        switched = client.put(
+            f"/calculations/{created['id']}",
+            json={"operation": "add", "operand1": 1, "operand2": 1},
+            headers=auth_headers,
+        ).json()
+        assert switched["result"] == 2
+        assert switched["expression"] is None
+
+    def test_batch_mixes_expressions_and_arithmetic(self, client, auth_headers):
+        """Test expression items are evaluated alongside arithmetic ones."""
+        items = [
+            {"operation": "add", "operand1": 1, "operand2": 2},
+            {"operation": "expression", "expression": "x * x", "variables": {"x": 4}},
+            {"operation": "expression", "expression": "x / y", "variables": {"x": 1, "y": 0}},
+            {"operation": "expression", "expression": "x + y", "variables": {"x": 1}},
+        ]
+        body = client.post("/calculations/batch", json=items, headers=auth_headers).json()
+
+        assert [c["result"] for c in body["created"]] == [3, 16]
+        assert [e["index"] for e in body["errors"]] == [2, 3]
+
+    def test_invalid_expression_is_rejected(self, client, auth_headers):
+        """Test that unsafe or incomplete expressions fail validation (negative)."""
+        for payload in [
+            {"operation": "expression", "expression": "__import__('os')"},
+            {"operation": "expression", "expression": "a + b", "variables": {"a": 1}},
+            {"operation": "expression"},
+            {"operation": "expression", "expression": "1" + "0" * 400},
+            {"operation": "expression", "expression": "a", "variables": {"a": 1, "<img src=x onerror=alert(1)>": 2}},
+        ]:
+            response = client.post("/calculations", json=payload, headers=auth_headers)
+            assert response.status_code == 422
+
+    def test_overflowing_expression_is_rejected(self, client, auth_headers):
+        """Test a result beyond float range is a 400, not a stored null (negative)."""
+        payload = {"operation": "expression", "expression": "a * b", "variables": {"a": 1e308, "b": 10}}
+
+        response = client.post("/calculations", json=payload, headers=auth_headers)
+
+        assert response.status_code == 400
+        assert client.get("/calculations", headers=auth_headers).json() == []
+
+    def test_arithmetic_drops_formula_fields(self, client, auth_headers):
+        """Test expression and variables are not stored for arithmetic operations."""
+        payload = {"operation": "add", "operand1": 1, "operand2": 2, "expression": "a", "variables": {"a": 1}}
+
+        created = client.post("/calculations", json=payload, headers=auth_headers).json()
+
+        assert created["result"] == 3
+        assert created["expression"] is None
+        assert created["variables"] is None
+
+    def test_import_and_export_expressions(self, client, auth_headers):
+        """Test expressions round-trip through CSV import and export."""
+        body = (
+            "operation,operand1,operand2,expression,variables\r\n"
+            'expression,,,a - b,"{""a"": 5, ""b"": 2}"\r\n'
+            "add,1,2,,\r\n"
+        )
+        summary = client.post("/calculations/import?format=csv", content=body, headers=auth_headers).json()
+        assert summary["imported"] == 2
+
+        export = client.get("/calculations/export?format=ndjson", headers=auth_headers).text
+        rows = [json.loads(line) for line in export.splitlines()]
+        assert rows[0]["variables"] == {"a": 5.0, "b": 2.0}
+        assert rows[0]["result"] == 3.0
+        assert rows[1]["expression"] is None
@@ -0,0 +1,102 @@
+from app.database import Calculation
+from app.idempotency import idempotency_cache
+
+
+def count_calculations(db):
+    db.expire_all()
+    return db.query(Calculation).count()
+
+
+class TestIdempotencyKeys:
+    """API tests for the Idempotency-Key header on POST /calculations and /calculations/batch."""
+
+    payload = {"operation": "multiply", "operand1": 6, "operand2": 7}
+
+    def test_retry_replays_the_first_response(self, client, auth_headers, db):
+        """Test a retried add returns the stored response without a new row."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-1"}
+
+        first = client.post("/calculations", json=self.payload, headers=headers)
+        retry = client.post("/calculations", json=self.payload, headers=headers)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert first.json()["result"] == 42
+        assert "idempotent-replayed" not in first.headers
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert count_calculations(db) == 1
+        stats = client.get("/calculations/stats", headers=auth_headers).json()
+        assert stats["count"] == 1
+
+    def test_replay_skips_the_computation(self, client, auth_headers, monkeypatch):
+        """Test a replayed add returns the stored result without calculating again."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-compute"}
+        first = client.post("/calculations", json=self.payload, headers=headers)
+
+        def fail(*args):
+            raise AssertionError("calculate_result called on replay")
+
+        monkeypatch.setattr("app.main.calculate_result", fail)
+        retry = client.post("/calculations", json=self.payload, headers=headers)
+
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+
+    def test_database_replays_after_cache_loss(self, client, auth_headers, db):
+        """Test a retry reaching a worker without the cached entry is replayed from the table."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-2"}
+        first = client.post("/calculations", json=self.payload, headers=headers)
+        idempotency_cache.clear()
+
+        retry = client.post("/calculations", json=self.payload, headers=headers)
+
+        assert retry.status_code == 201
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert count_calculations(db) == 1
+
+    def test_key_reused_for_another_request(self, client, auth_headers, db):
+        """Test a key sent with a different body is rejected (negative)."""
+        headers = {**auth_headers, "Idempotency-Key": "retry-3"}
+        client.post("/calculations", json=self.payload, headers=headers)
+
+        response = client.post("/calculations", json={**self.payload, "operand2": 8}, headers=headers)
+
+        assert response.status_code == 422
+        assert count_calculations(db) == 1
+
+    def test_keys_are_scoped_per_user(self, client, auth_headers, db):
+        """Test two users may use the same key independently."""
+        client.post("/register", json={"username": "other", "email": "other@example.com", "password": "password123"})
+        other_token = client.post("/token", data={"username": "other", "password": "password123"}).json()
+        other_headers = {"Authorization": f"Bearer {other_token['access_token']}", "Idempotency-Key": "shared"}
+
+        mine = client.post("/calculations", json=self.payload, headers={**auth_headers, "Idempotency-Key": "shared"})
+        theirs = client.post("/calculations", json=self.payload, headers=other_headers)
+
+        assert mine.json()["id"] != theirs.json()["id"]
+        assert "idempotent-replayed" not in theirs.headers
+        assert count_calculations(db) == 2
+
+    def test_batch_retry_is_replayed(self, client, auth_headers, db):
+        """Test a retried batch, including its item errors, is replayed as a whole."""
+        items = [{"operation": "add", "operand1": 1, "operand2": 2}, {"operation": "divide", "operand1": 1, "operand2": 0}]
+        headers = {**auth_headers, "Idempotency-Key": "batch-1"}
+
+        first = client.post("/calculations/batch", json=items, headers=headers)
+        retry = client.post("/calculations/batch", json=items, headers=headers)
+
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert len(first.json()["created"]) == 1
+        assert len(first.json()["errors"]) == 1
+        assert count_calculations(db) == 1
+
+    def test_invalid_key_is_rejected(self, client, auth_headers, db):
+        """Test overlong keys fail validation and nothing is written (negative)."""
+        response = client.post(
+            "/calculations", json=self.payload, headers={**auth_headers, "Idempotency-Key": "k" * 256}
+        )
+
+        assert response.status_code == 422
+        assert count_calculations(db) == 0
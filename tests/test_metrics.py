@@ -0,0 +1,77 @@
+import threading
+
+from app.metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetricsRegistry:
+    """Unit tests for the in-process metrics."""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Test bucket counts, sum and count in the text format."""
+        registry = Registry()
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.labels("/a").observe(value)
+
+        lines = registry.render().splitlines()
+
+        assert "# TYPE latency_seconds histogram" in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum{route="/a"} 3.65' in lines
+        assert 'latency_seconds_count{route="/a"} 4' in lines
+
+    def test_observations_from_many_threads_are_all_counted(self):
+        """Test that per-thread shards add up to the exact total."""
+        registry = Registry()
+        counter = Counter("jobs_total", "Jobs.", registry=registry)
+        gauge = Gauge("running", "Running.", registry=registry)
+
+        def work():
+            for _ in range(10000):
+                counter.inc()
+                gauge.inc()
+                gauge.dec()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.labels().value == 40000
+        assert gauge.labels().value == 0
+
+    def test_label_values_are_escaped(self):
+        """Test quotes and newlines in label values."""
+        registry = Registry()
+        Counter("odd_total", "Odd.", ("name",), registry=registry).labels('a"b\n').inc()
+
+        assert 'odd_total{name="a\\"b\\n"} 1.0' in registry.render()
+
+
+class TestMetricsEndpoint:
+    """API tests for GET /metrics."""
+
+    def test_exposes_route_database_and_cache_metrics(self, client, auth_headers):
+        """Test latency is labelled by route template and DB statements are timed."""
+        created = client.post(
+            "/calculations", json={"operation": "add", "operand1": 1, "operand2": 2}, headers=auth_headers
+        ).json()
+        client.get(f"/calculations/{created['id']}", headers=auth_headers)
+        client.get("/no/such/path")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert 'http_request_duration_seconds_count{method="GET",route="/calculations/{calculation_id}",status="200"}' in body
+        assert 'route="unmatched",status="404"' in body
+        assert f"/calculations/{created['id']}" not in body
+        assert 'db_statement_duration_seconds_count{engine=' in body
+        assert 'statement="INSERT"' in body
+        assert 'password_hash_duration_seconds_count{operation="hash"}' in body
+        assert "http_requests_in_flight 1.0" in body
+        assert 'cache_requests_total{cache="auth",result="hit"}' in body
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, text
+
+from app.database import Base
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def schema_differences(engine) -> list:
+    with engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+
+class TestMigrations:
+    """Tests for upgrading a database created before the current models."""
+
+    def test_baseline_upgrades_to_current_models(self, tmp_path):
+        """Test a baseline database with data ends up matching the models."""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        engine = create_engine(url)
+        command.upgrade(alembic_config(url), "0001")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')"
+            ))
+            connection.execute(text(
+                "INSERT INTO calculations (operation, operand1, operand2, result, user_id) VALUES ('add', 1, 2, 3, 1)"
+            ))
+
+        command.upgrade(alembic_config(url), "head")
+
+        assert schema_differences(engine) == []
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT version, expression FROM calculations")).all() == [(0, None)]
+            assert connection.execute(text("SELECT calculations_version FROM users")).scalar() == 0
+        engine.dispose()
+
+    def test_tables_created_by_a_newer_build_are_kept(self, tmp_path):
+        """Test the upgrade skips tables that create_all already added to a baseline database."""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        engine = create_engine(url)
+        command.upgrade(alembic_config(url), "0001")
+        # What starting the new build on the old database does before anyone migrates
+        Base.metadata.create_all(bind=engine)
+
+        command.upgrade(alembic_config(url), "head")
+
+        assert schema_differences(engine) == []
+        engine.dispose()
+
+    def test_sqlite_ids_are_not_reused(self, tmp_path):
+        """Test new calculations get ids above every deleted one after the upgrade (negative)."""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        engine = create_engine(url)
+        command.upgrade(alembic_config(url), "0009")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')"
+            ))
+            connection.execute(text(
+                "INSERT INTO calculations (id, operation, operand1, operand2, result, user_id)"
+                " VALUES (1, 'add', 1, 2, 3, 1)"
+            ))
+            connection.execute(text(
+                "INSERT INTO calculation_tombstones (calculation_id, user_id, version, deleted_at)"
+                " VALUES (5, 1, 1, '2026-01-01')"
+            ))
+
+        command.upgrade(alembic_config(url), "head")
+
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO calculations (operation, operand1, operand2, result, user_id) VALUES ('add', 1, 2, 3, 1)"
+            ))
+            assert connection.execute(text("SELECT max(id) FROM calculations")).scalar() == 6
+        engine.dispose()
@@ -0,0 +1,104 @@
+import pytest
+
+from app import ratelimit
+from app.ratelimit import DatabaseBackend, MemoryBackend
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", fake)
+    monkeypatch.setattr(ratelimit.time, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "database"])
+def backend(request, db):
+    if request.param == "memory":
+        return MemoryBackend(shards=4)
+    from tests.conftest import test_engine
+    return DatabaseBackend(test_engine)
+
+
+class TestTokenBucket:
+    """Unit tests for both bucket backends."""
+
+    def test_burst_then_refill(self, backend, clock):
+        """Test a full bucket allows the burst, then one request per refill interval."""
+        assert [backend.acquire("k", 0.5, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert backend.acquire("k", 0.5, 3) == pytest.approx(2.0)
+
+        clock.now += 2.0
+        assert backend.acquire("k", 0.5, 3) == 0.0
+        assert backend.acquire("k", 0.5, 3) > 0
+
+    def test_keys_are_independent(self, backend, clock):
+        """Test exhausting one key leaves the others untouched."""
+        backend.acquire("a", 1, 1)
+
+        assert backend.acquire("a", 1, 1) > 0
+        assert backend.acquire("b", 1, 1) == 0.0
+
+    def test_refill_is_capped_at_burst(self, backend, clock):
+        """Test a long idle period does not bank more than the burst (negative)."""
+        backend.acquire("k", 1, 2)
+        clock.now += 3600
+
+        assert [backend.acquire("k", 1, 2) for _ in range(3)][-1] > 0
+
+    def test_memory_backend_is_bounded(self):
+        """Test the least recently used keys are evicted beyond max_keys."""
+        backend = MemoryBackend(shards=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            backend.acquire(key, 1, 1)
+
+        assert backend.acquire("a", 1, 1) == 0.0  # evicted, so full again
+        assert backend.acquire("c", 1, 1) > 0
+
+
+class TestRateLimitedEndpoints:
+    """API tests for 429 responses on /token and /register."""
+
+    def test_login_is_limited_per_username_before_bcrypt(self, client, test_user, monkeypatch):
+        """Test excess logins get 429 with Retry-After and never reach bcrypt (negative)."""
+        monkeypatch.setitem(ratelimit.LIMITS, "login_username", (1 / 60, 2))
+        credentials = {"username": test_user["username"].upper(), "password": "wrong"}
+        for _ in range(2):
+            assert client.post("/token", data=credentials).status_code == 401
+
+        def fail(*args):
+            raise AssertionError("a limited request must not hash")
+        monkeypatch.setattr("app.auth.verify_password", fail)
+        response = client.post("/token", data=credentials)
+
+        assert response.status_code == 429
+        assert 1 <= int(response.headers["Retry-After"]) <= 60
+        assert client.post("/token", data={**credentials, "username": "someone-else"}).status_code == 401
+
+    def test_register_is_limited_per_ip(self, client, monkeypatch):
+        """Test registrations from one client IP are limited (negative)."""
+        monkeypatch.setitem(ratelimit.LIMITS, "register_ip", (1 / 60, 1))
+        user = {"username": "first", "email": "first@example.com", "password": "password123"}
+        assert client.post("/register", json=user).status_code == 201
+
+        response = client.post("/register", json={**user, "username": "second", "email": "second@example.com"})
+
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        assert 'rate_limit_requests_total{limit="register_ip",result="limited"}' in client.get("/metrics").text
+
+    def test_limits_can_be_disabled(self, client, test_user, monkeypatch):
+        """Test RATE_LIMIT_ENABLED=false skips every check."""
+        monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", False)
+        monkeypatch.setitem(ratelimit.LIMITS, "login_username", (1 / 60, 1))
+        credentials = {"username": test_user["username"], "password": "wrong"}
+
+        assert [client.post("/token", data=credentials).status_code for _ in range(3)] == [401] * 3
@@ -0,0 +1,47 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app import responses
+from app.responses import dump_json
+
+
+class TestDumpJson:
+    """Unit tests for the response encoder."""
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_encoders_agree(self, use_orjson, monkeypatch):
+        """Test orjson and the stdlib fallback produce the same document."""
+        if use_orjson and responses.orjson is None:
+            pytest.skip("orjson is not installed")
+        if not use_orjson:
+            monkeypatch.setattr(responses, "orjson", None)
+        content = [{"id": 1, "result": 2.5, "expression": None, "variables": {"a": 1.0},
+                    "created_at": datetime(2024, 1, 2, 3, 4, 5, 678901), "note": "é"}]
+
+        assert json.loads(dump_json(content)) == [{
+            "id": 1, "result": 2.5, "expression": None, "variables": {"a": 1.0},
+            "created_at": "2024-01-02T03:04:05.678901", "note": "é",
+        }]
+
+
+class TestFastReadPath:
+    """API tests: browse and read bypass response_model but keep its shape."""
+
+    def test_browse_and_read_match_the_response_model(self, client, auth_headers):
+        """Test rows serialized directly equal the CalculationResponse output of POST."""
+        created = [
+            client.post("/calculations", json=payload, headers=auth_headers).json()
+            for payload in (
+                {"operation": "divide", "operand1": 1, "operand2": 3},
+                {"operation": "expression", "expression": "a * 2", "variables": {"a": 4}},
+            )
+        ]
+
+        listing = client.get("/calculations", headers=auth_headers)
+        single = client.get(f"/calculations/{created[0]['id']}", headers=auth_headers)
+
+        assert listing.headers["content-type"] == "application/json"
+        assert listing.json() == created
+        assert single.json() == created[0]
@@ -0,0 +1,70 @@
+import pytest
+
+from app.tokens import revoked_families, revoked_tokens
+
+
+@pytest.fixture
+def tokens(client, test_user):
+    """Log in and return the token response."""
+    response = client.post(
+        "/token", data={"username": test_user["username"], "password": test_user["password"]}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def refresh(client, refresh_token):
+    return client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+class TestRefreshTokens:
+    """API tests for POST /token/refresh and POST /token/revoke."""
+
+    def test_refresh_issues_working_tokens(self, client, tokens, monkeypatch):
+        """Test a refresh returns a new access token and rotates the refresh token without bcrypt."""
+        def fail(*args):
+            raise AssertionError("refresh must not hash passwords")
+        monkeypatch.setattr("app.auth.verify_password", fail)
+
+        response = refresh(client, tokens["refresh_token"])
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["token_type"] == "bearer"
+        assert data["refresh_token"] != tokens["refresh_token"]
+        me = client.get("/users/me", headers={"Authorization": f"Bearer {data['access_token']}"})
+        assert me.status_code == 200
+        assert refresh(client, data["refresh_token"]).status_code == 200
+
+    def test_reused_token_revokes_the_family(self, client, tokens):
+        """Test replaying a rotated token also revokes its successor (negative)."""
+        successor = refresh(client, tokens["refresh_token"]).json()["refresh_token"]
+
+        assert refresh(client, tokens["refresh_token"]).status_code == 401
+        assert refresh(client, successor).status_code == 401
+
+    def test_database_catches_replays_missed_by_the_cache(self, client, tokens):
+        """Test a replay is refused by another worker whose cache is empty (negative)."""
+        successor = refresh(client, tokens["refresh_token"]).json()["refresh_token"]
+        revoked_tokens.clear()
+        revoked_families.clear()
+
+        assert refresh(client, tokens["refresh_token"]).status_code == 401
+        assert refresh(client, successor).status_code == 401
+
+    def test_revoke_logs_out(self, client, tokens):
+        """Test a revoked token can no longer be refreshed (negative)."""
+        assert client.post("/token/revoke", json={"refresh_token": tokens["refresh_token"]}).status_code == 204
+        revoked_families.clear()
+
+        assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+    def test_refresh_token_is_not_an_access_token(self, client, tokens):
+        """Test a refresh token is rejected as a bearer token (negative)."""
+        response = client.get("/users/me", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        assert response.status_code == 401
+
+    def test_access_token_cannot_refresh(self, client, tokens):
+        """Test garbage and access tokens are rejected by /token/refresh (negative)."""
+        assert refresh(client, tokens["access_token"]).status_code == 401
+        assert refresh(client, "not-a-token").status_code == 401
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from app import main, writebehind
+from app.database import Calculation, CalculationStat, User
+from app.writebehind import WriteBehindQueue
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    """Enable write-behind for the app (requested before ``client``, so it is drained on shutdown)."""
+    queue = WriteBehindQueue(TestingSessionLocal, max_delay_ms=1)
+    monkeypatch.setattr(main, "write_behind", queue)
+    return queue
+
+
+@pytest.fixture
+def groups(monkeypatch):
+    """Record the size of every group commit."""
+    sizes = []
+    commit_group = writebehind.commit_group
+
+    def recording_commit_group(session_factory, rows):
+        sizes.append(len(rows))
+        return commit_group(session_factory, rows)
+    monkeypatch.setattr(writebehind, "commit_group", recording_commit_group)
+    return sizes
+
+
+def row(user_id, operand1=1.0):
+    return {"operation": "add", "operand1": operand1, "operand2": 2.0, "result": operand1 + 2, "user_id": user_id}
+
+
+async def submit_all(queue, rows):
+    try:
+        return await asyncio.gather(*(queue.submit(r) for r in rows), return_exceptions=True)
+    finally:
+        await queue.drain()
+
+
+class TestWriteBehindQueue:
+    """Unit tests for grouping, failures and draining."""
+
+    @pytest.fixture
+    def user_id(self, test_user, db):
+        return db.query(User).filter(User.username == test_user["username"]).one().id
+
+    def test_concurrent_rows_share_one_commit(self, user_id, db, groups):
+        """Test concurrent submits are committed together and each caller gets its own row."""
+        queue = WriteBehindQueue(TestingSessionLocal, max_delay_ms=50)
+
+        created = asyncio.run(submit_all(queue, [row(user_id, n) for n in range(10)]))
+
+        assert groups == [10]
+        assert [c.operand1 for c in created] == list(range(10))
+        assert len({c.id for c in created}) == 10
+        db.expire_all()
+        assert db.query(Calculation).count() == 10
+        assert db.query(CalculationStat).filter(CalculationStat.user_id == user_id).one().count == 10
+
+    def test_groups_are_capped_at_max_rows(self, user_id, groups):
+        """Test a group never holds more than max_rows rows."""
+        queue = WriteBehindQueue(TestingSessionLocal, max_rows=4, max_delay_ms=50)
+
+        asyncio.run(submit_all(queue, [row(user_id) for _ in range(10)]))
+
+        assert groups == [4, 4, 2]
+
+    def test_failed_row_only_fails_its_own_request(self, user_id, db, groups):
+        """Test a group that fails is retried row by row, so only the bad row errors (negative)."""
+        queue = WriteBehindQueue(TestingSessionLocal, max_delay_ms=50)
+        bad = {**row(user_id), "operation": None}
+
+        results = asyncio.run(submit_all(queue, [row(user_id), bad, row(user_id)]))
+
+        assert groups == [3, 1, 1, 1]
+        assert isinstance(results[1], Exception)
+        assert results[0].id and results[2].id
+        db.expire_all()
+        assert db.query(Calculation).count() == 2
+
+    def test_drain_commits_queued_rows(self, user_id, db):
+        """Test drain waits for rows still in the queue and stops the task."""
+        queue = WriteBehindQueue(TestingSessionLocal, max_delay_ms=10_000)
+
+        async def submit_then_drain():
+            pending = [asyncio.create_task(queue.submit(row(user_id))) for _ in range(3)]
+            await asyncio.sleep(0)
+            await queue.drain()
+            return pending
+
+        pending = asyncio.run(submit_then_drain())
+
+        assert all(task.done() and task.result().id for task in pending)
+        assert queue.pending() == 0
+        db.expire_all()
+        assert db.query(Calculation).count() == 3
+
+
+class TestWriteBehindEndpoint:
+    """API tests for POST /calculations with WRITE_BEHIND_ENABLED."""
+
+    payload = {"operation": "multiply", "operand1": 6, "operand2": 7}
+
+    def test_add_returns_the_committed_row(self, write_behind, client, auth_headers, groups):
+        """Test the response carries the id of a row that is already committed."""
+        response = client.post("/calculations", json=self.payload, headers=auth_headers)
+
+        assert response.status_code == 201
+        assert response.json()["result"] == 42
+        assert groups == [1]
+        fetched = client.get(f"/calculations/{response.json()['id']}", headers=auth_headers)
+        assert fetched.json() == response.json()
+        assert client.get("/calculations/stats", headers=auth_headers).json()["count"] == 1
+
+    def test_invalid_calculation_is_not_queued(self, write_behind, client, auth_headers, groups):
+        """Test a calculation error is answered with 400 before reaching the queue (negative)."""
+        response = client.post(
+            "/calculations", json={"operation": "expression", "expression": "a / b", "variables": {"a": 1, "b": 0}},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 400
+        assert groups == []
+
+    def test_idempotent_requests_bypass_the_queue(self, write_behind, client, auth_headers, groups):
+        """Test requests with an Idempotency-Key still commit with their key row."""
+        headers = {**auth_headers, "Idempotency-Key": "bypass"}
+
+        first = client.post("/calculations", json=self.payload, headers=headers)
+        retry = client.post("/calculations", json=self.payload, headers=headers)
+
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert groups == []